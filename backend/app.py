@@ -1,8 +1,15 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context
 from flask_cors import CORS
-from mongo_db import db
-from face_engine import face_engine
+from mongo_db import db, EMPLOYEE_PROJECTION, RECOGNITION_TOP_K, RECOGNITION_MIN_MARGIN
+from face_engine import face_engine, STATE_FAILED
+from inference_pool import inference_pool, recognition_batcher, PoolSaturated
+from face_tracker import face_tracker
+from embedding_cache import embedding_cache
+from scan_stream import ScanStreamManager, STREAM_RECORD_COOLDOWN_SECONDS
+from gallery_sync import GallerySync, GALLERY_SYNC_ENABLED
+from embedding_codec import decode_embedding, encode_embedding, EMBEDDING_FORMATS
 from datetime import datetime
+import threading
 import traceback
 import sync_mongo_to_dynamo
 import boto3
@@ -23,10 +30,28 @@ CORS(app,
      max_age=3600)
 INSIGHTS_TABLE = 'ai-insight'
 AWS_REGION = 'ap-southeast-2'
+FACE_ENGINE_RETRY_AFTER = 5  # detik, dikirim sebagai Retry-After selama engine belum ready
 
 dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
 insights_table = dynamodb.Table(INSIGHTS_TABLE)
 
+def load_gallery_at_boot():
+    """Map on-disk gallery snapshot (atau full load) sebelum scan pertama datang"""
+    try:
+        db.ensure_gallery()
+    except Exception as e:
+        # Recognition tetap mencoba load lazily saat request pertama
+        print(f"⚠️ Gallery boot load failed: {e}")
+        traceback.print_exc()
+
+# Gallery di worker ini mengikuti registrasi dari node lain lewat MongoDB change stream
+# (sync thread me-load gallery sendiri setelah stream dibuka)
+gallery_sync = GallerySync(db) if GALLERY_SYNC_ENABLED else None
+if gallery_sync:
+    gallery_sync.start()
+else:
+    threading.Thread(target=load_gallery_at_boot, name='gallery-loader', daemon=True).start()
+
 @app.route('/api/insights/latest', methods=['GET'])
 def get_latest_insights():
     """Get the most recent AI insights"""
@@ -233,12 +258,140 @@ def manual_sync():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({
-        'status': 'healthy',
+    """Health + readiness. Return 503 sampai face engine selesai warm-up."""
+    ready = face_engine.is_ready
+    response = jsonify({
+        'status': 'healthy' if ready else ('unhealthy' if face_engine.state == STATE_FAILED else 'starting'),
+        'ready': ready,
         'timestamp': datetime.now().isoformat(),
         'database': 'connected',
-        'face_model': 'loaded' if getattr(face_engine, 'model', None) else 'error'
+        'face_model': face_engine.state,
+        'face_model_load_ms': face_engine.load_time_ms,
+        'face_model_warmup_ms': face_engine.warmup_ms,
+        'inference_pool': inference_pool.get_stats()
     })
+    if ready:
+        return response, 200
+    response.headers['Retry-After'] = str(FACE_ENGINE_RETRY_AFTER)
+    return response, 503
+
+RAW_IMAGE_MIMETYPES = ('image/jpeg', 'image/png')
+
+def get_face_request_data():
+    """
+    Ambil payload untuk face endpoints
+    
+    Selain JSON (base64 data-URL di 'image' / 'images'), juga terima:
+    - multipart/form-data: file field 'image', 'images' (multiple), dll,
+      field lain dari form
+    - raw image/jpeg atau image/png body: jadi 'image', field lain dari query string
+    
+    Image dari multipart/raw body berupa bytes dan langsung di-decode oleh
+    FaceEngine tanpa base64 round trip.
+    """
+    if request.mimetype in RAW_IMAGE_MIMETYPES:
+        data = request.args.to_dict()
+        data['image'] = request.get_data()
+        return data
+    
+    if request.mimetype == 'multipart/form-data':
+        data = request.form.to_dict()
+        for field in request.files:
+            files = request.files.getlist(field)
+            if field == 'images':
+                data[field] = [file.read() for file in files]
+            else:
+                data[field] = files[0].read()
+        return data
+    
+    return request.json or {}
+
+def get_embedding_format(data):
+    """Opt-in compact embedding format: 'json' (default), 'float32', atau 'float16'"""
+    embedding_format = data.get('embeddingFormat') or request.args.get('embeddingFormat') or 'json'
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise ValueError(f"Unsupported embeddingFormat: {embedding_format}")
+    return embedding_format
+
+def get_roi_hint(data):
+    """
+    Optional roiHint: bbox [x1, y1, x2, y2] dari response sebelumnya
+    
+    Diterima sebagai JSON list atau string "x1,y1,x2,y2" (query/form field).
+    """
+    roi_hint = data.get('roiHint')
+    if roi_hint in (None, ''):
+        return None
+    if isinstance(roi_hint, str):
+        roi_hint = roi_hint.split(',')
+    try:
+        roi_hint = [float(value) for value in roi_hint]
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid roiHint: {data.get('roiHint')}")
+    if len(roi_hint) != 4 or roi_hint[2] <= roi_hint[0] or roi_hint[3] <= roi_hint[1]:
+        raise ValueError(f"Invalid roiHint: {data.get('roiHint')}")
+    return roi_hint
+
+def get_recognition_params(data):
+    """
+    Optional topK (jumlah kandidat) dan minMargin (ambiguity rule) dari request
+    
+    Returns:
+        tuple: (top_k, min_margin)
+    """
+    try:
+        top_k = int(data.get('topK', RECOGNITION_TOP_K))
+        min_margin = float(data.get('minMargin', RECOGNITION_MIN_MARGIN))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid topK/minMargin: {data.get('topK')}, {data.get('minMargin')}")
+    if not 1 <= top_k <= 20 or not 0 <= min_margin < 1:
+        raise ValueError(f"Invalid topK/minMargin: {top_k}, {min_margin}")
+    return top_k, min_margin
+
+def pool_saturated_response(error):
+    """Fast 429/503 saat inference pool penuh atau wait timeout"""
+    print(f"⚠️ Face inference rejected: {error}")
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'inference_pool': inference_pool.get_stats()
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status_code
+
+def recognize_tracked(extract_result, session_id, threshold=0.6, top_k=RECOGNITION_TOP_K, min_margin=RECOGNITION_MIN_MARGIN):
+    """
+    db.recognize_face untuk hasil extract_face_embedding
+    
+    Selama face tracker masih di track yang sama (embedding di-reuse),
+    identity dari frame sebelumnya dipakai ulang tanpa gallery search.
+    """
+    track = extract_result.get('track')
+    if face_tracker is None or track is None:
+        return db.recognize_face(extract_result['embedding'], threshold=threshold, top_k=top_k, min_margin=min_margin)
+    
+    if track['reused']:
+        identity = face_tracker.get_identity(session_id, track['track_id'])
+        if identity is not None:
+            # Copy supaya caller bisa menambah 'confidence' tanpa mengubah cache
+            return {**identity, 'employee': dict(identity['employee']), 'tracked': True}
+    
+    result = db.recognize_face(extract_result['embedding'], threshold=threshold, top_k=top_k, min_margin=min_margin)
+    if result.get('success'):
+        face_tracker.set_identity(session_id, track['track_id'], result)
+    return result
+
+def face_engine_not_ready():
+    """Fast 503 response selama face engine masih loading/warming (None jika ready)"""
+    if face_engine.is_ready:
+        return None
+    response = jsonify({
+        'success': False,
+        'error': f'Face engine not ready ({face_engine.state})',
+        'state': face_engine.state
+    })
+    response.headers['Retry-After'] = str(FACE_ENGINE_RETRY_AFTER)
+    return response, 503
  
 @app.route('/api/routes', methods=['GET'])
 def list_routes():
@@ -574,7 +727,7 @@ def review_pending_request(request_id):
                 }), 400
             
             # Get employee data from selected employee_id
-            employee = db.employees.find_one({'employee_id': selected_employee_id})
+            employee = db.employees.find_one({'employee_id': selected_employee_id}, EMPLOYEE_PROJECTION)
             
             if not employee:
                 return jsonify({
@@ -648,25 +801,44 @@ def review_pending_request(request_id):
 @app.route('/api/extract-face', methods=['POST'])
 def extract_face():
     """Extract face embedding from image"""
+    not_ready = face_engine_not_ready()
+    if not_ready:
+        return not_ready
+    
     try:
-        data = request.json or {}
+        data = get_face_request_data()
         image_data = data.get('image')
         
         if not image_data:
             return jsonify({'success': False, 'error': 'No image provided'}), 400
         
+        try:
+            embedding_format = get_embedding_format(data)
+            roi_hint = get_roi_hint(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         print("🔍 Extracting face embedding from image...")
         
-        result = face_engine.extract_face_embedding(image_data)
+        result = inference_pool.run(
+            'extract_face_embedding',
+            image_data,
+            kiosk_id=data.get('kioskId'),
+            session_id=data.get('sessionId'),
+            roi_hint=roi_hint
+        )
         
         if result.get('success'):
             print(f"✅ Face embedding extracted: {len(result['embedding'])} dimensions")
             print(f"   Detection confidence: {result['confidence']:.3f}")
-            return jsonify(result)
+            # Response baru; result dari engine (bisa dari embedding cache) tidak diubah
+            return jsonify(dict(result, embedding=encode_embedding(result['embedding'], embedding_format)))
         else:
             print(f"⚠️ Face extraction failed: {result.get('error')}")
             return jsonify(result), 400
             
+    except PoolSaturated as e:
+        return pool_saturated_response(e)
     except Exception as e:
         print(f"❌ Error extracting face: {e}")
         traceback.print_exc()
@@ -676,25 +848,50 @@ def extract_face():
 def recognize_face_embedding():
     """Recognize face from image or embedding"""
     try:
-        data = request.json or {}
+        data = get_face_request_data()
+        
+        try:
+            top_k, min_margin = get_recognition_params(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # Check if image or embedding provided
         if 'image' in data:
+            not_ready = face_engine_not_ready()
+            if not_ready:
+                return not_ready
+            
+            try:
+                roi_hint = get_roi_hint(data)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            
             print("📸 Image provided, extracting embedding...")
-            extract_result = face_engine.extract_face_embedding(data['image'])
+            extract_result = inference_pool.run(
+                'extract_face_embedding',
+                data['image'],
+                kiosk_id=data.get('kioskId'),
+                session_id=data.get('sessionId'),
+                roi_hint=roi_hint
+            )
             
             if not extract_result.get('success'):
                 return jsonify({
                     'success': False,
                     'error': extract_result.get('error', 'Failed to extract face'),
-                    'face_detected': extract_result.get('face_detected', False)
+                    'face_detected': extract_result.get('face_detected', False),
+                    'quality': extract_result.get('quality')
                 }), 400
             
             face_embedding = extract_result['embedding']
             extraction_confidence = extract_result['confidence']
             
         elif 'faceEmbedding' in data:
-            face_embedding = data['faceEmbedding']
+            # Legacy JSON list atau compact {'version', 'dtype', 'dim', 'data'}
+            try:
+                face_embedding = decode_embedding(data['faceEmbedding'])
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'Invalid faceEmbedding: {e}'}), 400
             extraction_confidence = 0.95
             
         else:
@@ -705,8 +902,12 @@ def recognize_face_embedding():
         
         print(f"🔍 Face recognition request - embedding size: {len(face_embedding)}")
         
-        # Recognize from database
-        result = db.recognize_face(face_embedding, threshold=0.6)
+        # Recognize from database (identity di-reuse selama face tracker di track yang sama)
+        if 'image' in data:
+            result = recognize_tracked(extract_result, data.get('sessionId'), threshold=0.6,
+                                       top_k=top_k, min_margin=min_margin)
+        else:
+            result = db.recognize_face(face_embedding, threshold=0.6, top_k=top_k, min_margin=min_margin)
         
         if result.get('success'):
             employee = result['employee']
@@ -722,6 +923,8 @@ def recognize_face_embedding():
             return jsonify({
                 'success': True,
                 'employee': employee,
+                'candidates': result.get('candidates', []),
+                'margin': result.get('margin'),
                 'message': 'Face recognized successfully'
             })
         else:
@@ -730,21 +933,144 @@ def recognize_face_embedding():
             
             return jsonify({
                 'success': False,
-                'message': 'No matching employee found',
+                'message': result.get('message', 'No matching employee found'),
                 'similarity': best_similarity,
-                'threshold': 0.6
+                'threshold': 0.6,
+                'ambiguous': result.get('ambiguous', False),
+                'candidates': result.get('candidates', []),
+                'margin': result.get('margin')
             }), 404
         
+    except PoolSaturated as e:
+        return pool_saturated_response(e)
     except Exception as e:
         print(f"❌ Face recognition error: {e}")
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/scan', methods=['POST'])
+def scan_face():
+    """
+    Extract + recognize + record attendance dalam satu request
+    
+    Employee data hasil matching langsung dipakai untuk attendance, jadi
+    tidak ada query employees tambahan. Kirim dryRun=true untuk detection
+    + matching saja tanpa mencatat attendance.
+    """
+    not_ready = face_engine_not_ready()
+    if not_ready:
+        return not_ready
+    
+    try:
+        data = get_face_request_data()
+        image_data = data.get('image')
+        dry_run = str(data.get('dryRun', 'false')).lower() in ('true', '1')
+        
+        if not image_data:
+            return jsonify({'success': False, 'error': 'No image provided'}), 400
+        
+        try:
+            roi_hint = get_roi_hint(data)
+            top_k, min_margin = get_recognition_params(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        print(f"📷 SCAN - dry run: {dry_run}")
+        
+        extract_result = inference_pool.run(
+            'extract_face_embedding',
+            image_data,
+            kiosk_id=data.get('kioskId'),
+            session_id=data.get('sessionId'),
+            roi_hint=roi_hint
+        )
+        
+        if not extract_result.get('success'):
+            return jsonify({
+                'success': False,
+                'stage': 'quality' if extract_result.get('quality') else 'detection',
+                'error': extract_result.get('error', 'Failed to extract face'),
+                'face_detected': extract_result.get('face_detected', False),
+                'quality': extract_result.get('quality')
+            }), 400
+        
+        detection = {
+            'face_detected': True,
+            'confidence': extract_result['confidence'],
+            'bbox': extract_result['bbox'],
+            'track': extract_result.get('track')
+        }
+        
+        result = recognize_tracked(extract_result, data.get('sessionId'), threshold=0.6,
+                                   top_k=top_k, min_margin=min_margin)
+        
+        if not result.get('success'):
+            return jsonify({
+                'success': False,
+                'stage': 'recognition',
+                'detection': detection,
+                'message': result.get('message', 'No matching employee found'),
+                'similarity': result.get('similarity', 0),
+                'threshold': 0.6,
+                'ambiguous': result.get('ambiguous', False),
+                'candidates': result.get('candidates', []),
+                'margin': result.get('margin')
+            }), 404
+        
+        employee = result['employee']
+        employee['confidence'] = extract_result['confidence'] * 0.3 + employee['similarity'] * 0.7
+        
+        print(f"✅ Face recognized: {employee['name']} ({employee['employee_id']})")
+        
+        if dry_run:
+            return jsonify({
+                'success': True,
+                'dry_run': True,
+                'detection': detection,
+                'employee': employee,
+                'candidates': result.get('candidates', []),
+                'margin': result.get('margin'),
+                'attendance': None
+            })
+        
+        attendance_result = db.record_attendance_auto(
+            employee['employee_id'],
+            employee['confidence'],
+            employee=employee
+        )
+        
+        if not attendance_result or not attendance_result.get('success'):
+            error_msg = attendance_result.get('error') if attendance_result else 'Failed to record attendance'
+            return jsonify({
+                'success': False,
+                'stage': 'attendance',
+                'detection': detection,
+                'employee': employee,
+                'error': error_msg
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'dry_run': False,
+            'detection': detection,
+            'employee': employee,
+            'candidates': result.get('candidates', []),
+            'margin': result.get('margin'),
+            'attendance': attendance_result
+        })
+        
+    except PoolSaturated as e:
+        return pool_saturated_response(e)
+    except Exception as e:
+        print(f"❌ Scan error: {e}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/register', methods=['POST'])
 def register_employee():
     """Register new employee with face recognition"""
     try:
-        data = request.json or {}
+        data = get_face_request_data()
         print(f"📝 REGISTRATION - Data keys: {list(data.keys())}")
         
         name = data.get('name')
@@ -756,10 +1082,15 @@ def register_employee():
         if not name:
             return jsonify({'success': False, 'error': 'Name is required'}), 400
         
+        if ('images' in data and data['images']) or 'image' in data:
+            not_ready = face_engine_not_ready()
+            if not_ready:
+                return not_ready
+        
         # Extract embeddings from images
         if 'images' in data and data['images']:
             print(f"📸 Processing {len(data['images'])} images...")
-            extract_result = face_engine.extract_multiple_embeddings(data['images'])
+            extract_result = inference_pool.run('extract_multiple_embeddings', data['images'])
             
             if not extract_result.get('success'):
                 return jsonify({
@@ -772,7 +1103,7 @@ def register_employee():
             
         elif 'image' in data:
             print("📸 Processing single image...")
-            extract_result = face_engine.extract_face_embedding(data['image'])
+            extract_result = inference_pool.run('extract_face_embedding', data['image'])
             
             if not extract_result.get('success'):
                 return jsonify({
@@ -785,7 +1116,13 @@ def register_employee():
             
         elif 'faceEmbeddings' in data or 'faceEmbedding' in data:
             print("⚠️ Using direct embeddings (not recommended)")
-            face_embeddings = data.get('faceEmbeddings') or [data.get('faceEmbedding')]
+            try:
+                face_embeddings = [
+                    decode_embedding(emb)
+                    for emb in (data.get('faceEmbeddings') or [data.get('faceEmbedding')])
+                ]
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'Invalid face embedding: {e}'}), 400
             avg_confidence = 0.95
             
         else:
@@ -799,7 +1136,7 @@ def register_employee():
         
         # Validate embeddings
         for i, emb in enumerate(face_embeddings):
-            if not isinstance(emb, list) or len(emb) != 512:
+            if len(emb) != 512:
                 return jsonify({
                     'success': False,
                     'error': f'Invalid embedding {i+1}: expected 512 dimensions, got {len(emb)}'
@@ -830,6 +1167,8 @@ def register_employee():
                 'error': result.get('error')
             }), 500
             
+    except PoolSaturated as e:
+        return pool_saturated_response(e)
     except Exception as e:
         print(f"❌ Registration error: {e}")
         traceback.print_exc()
@@ -840,6 +1179,14 @@ def get_face_engine_info():
     """Get information about the face recognition engine"""
     try:
         info = face_engine.get_model_info()
+        # Cascade dan quality gate counters dari semua engine di pool, bukan hanya engine global
+        info.update(inference_pool.get_detection_stats())
+        info['inference_pool'] = inference_pool.get_stats()
+        info['recognition_batcher'] = recognition_batcher.get_stats() if recognition_batcher else None
+        info['face_tracker'] = face_tracker.get_stats() if face_tracker else None
+        info['embedding_cache'] = embedding_cache.get_stats() if embedding_cache else None
+        info['gallery_search'] = db.gallery.backend.get_stats()
+        info['gallery_sync'] = gallery_sync.get_stats() if gallery_sync else None
         return jsonify(info)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -847,20 +1194,26 @@ def get_face_engine_info():
 @app.route('/api/verify-face', methods=['POST'])
 def verify_face():
     """Verify if two images contain the same person"""
+    not_ready = face_engine_not_ready()
+    if not_ready:
+        return not_ready
+    
     try:
-        data = request.json or {}
+        data = get_face_request_data()
         
         image1 = data.get('image1')
         image2 = data.get('image2')
-        threshold = data.get('threshold', 0.6)
+        threshold = float(data.get('threshold', 0.6))
         
         if not image1 or not image2:
             return jsonify({'error': 'Both image1 and image2 are required'}), 400
         
-        result = face_engine.verify_face(image1, image2, threshold)
+        result = inference_pool.run('verify_face', image1, image2, threshold)
         
         return jsonify(result)
         
+    except PoolSaturated as e:
+        return pool_saturated_response(e)
     except Exception as e:
         print(f"❌ Face verification error: {e}")
         traceback.print_exc()
@@ -955,6 +1308,264 @@ def manual_attendance():
         response.headers["Access-Control-Allow-Origin"] = "http://localhost:5173"
         return response, 500
 
+@app.route('/api/scan/group', methods=['POST'])
+def scan_group():
+    """
+    Group check-in: semua face dalam satu frame
+    
+    Semua face di-embed dalam satu recognition batch, di-match ke gallery
+    dengan satu matrix-matrix product, dan attendance untuk semua match
+    ditulis dengan satu bulk write. Kirim dryRun=true untuk matching saja.
+    """
+    not_ready = face_engine_not_ready()
+    if not_ready:
+        return not_ready
+    
+    try:
+        data = get_face_request_data()
+        image_data = data.get('image')
+        dry_run = str(data.get('dryRun', 'false')).lower() in ('true', '1')
+        
+        if not image_data:
+            return jsonify({'success': False, 'error': 'No image provided'}), 400
+        
+        try:
+            max_faces = int(data.get('maxFaces', 0))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': f"Invalid maxFaces: {data.get('maxFaces')}"}), 400
+        
+        print(f"👥 GROUP SCAN - dry run: {dry_run}")
+        
+        extract_result = inference_pool.run(
+            'extract_group_embeddings',
+            image_data,
+            kiosk_id=data.get('kioskId'),
+            max_faces=max_faces
+        )
+        
+        if not extract_result.get('success'):
+            return jsonify({
+                'success': False,
+                'stage': 'detection',
+                'error': extract_result.get('error', 'Failed to extract faces')
+            }), 400
+        
+        faces = extract_result['faces']
+        embedded_index = [idx for idx, face in enumerate(faces) if face['embedding'] is not None]
+        matches = db.recognize_faces([faces[idx]['embedding'] for idx in embedded_index], threshold=0.6)
+        
+        results = [
+            {
+                'bbox': face['bbox'],
+                'confidence': face['confidence'],
+                'quality': face['quality'],
+                'recognized': False,
+                'employee': None
+            }
+            for face in faces
+        ]
+        
+        recognized = []
+        for idx, match in zip(embedded_index, matches):
+            if match.get('success'):
+                employee = match['employee']
+                employee['confidence'] = faces[idx]['confidence'] * 0.3 + employee['similarity'] * 0.7
+                results[idx]['recognized'] = True
+                results[idx]['employee'] = employee
+                recognized.append(employee)
+            else:
+                results[idx]['similarity'] = match.get('similarity', 0)
+                results[idx]['message'] = match.get('message') or match.get('error')
+        
+        print(f"✅ Group scan: {len(recognized)}/{len(faces)} faces recognized")
+        
+        attendance_result = None
+        if recognized and not dry_run:
+            # Cooldown sama dengan stream: grup yang di-scan ulang tidak langsung jadi check-out
+            attendance_result = db.record_attendance_bulk(recognized, cooldown_seconds=STREAM_RECORD_COOLDOWN_SECONDS)
+            if not attendance_result.get('success'):
+                return jsonify({
+                    'success': False,
+                    'stage': 'attendance',
+                    'faces': results,
+                    'error': attendance_result.get('error', 'Failed to record attendance')
+                }), 500
+            for face in results:
+                if face['recognized']:
+                    face['attendance'] = attendance_result['results'].get(face['employee']['employee_id'])
+        
+        return jsonify({
+            'success': True,
+            'dry_run': dry_run,
+            'face_count': len(faces),
+            'recognized_count': len(recognized),
+            'faces': results,
+            'attendance': {
+                'checked_in': attendance_result['checked_in'],
+                'checked_out': attendance_result['checked_out']
+            } if attendance_result else None
+        })
+        
+    except PoolSaturated as e:
+        return pool_saturated_response(e)
+    except Exception as e:
+        print(f"❌ Group scan error: {e}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== STREAMING SCAN ====================
+
+def process_stream_frame(stream, image_data, params):
+    """
+    Detection + recognition untuk satu frame dari scan stream
+    
+    Memakai session id stream sebagai face tracker key, jadi frame
+    berturut-turut dari face yang sama tidak menjalankan recognition ulang.
+    Jika recordAttendance=true, attendance dicatat sekali per employee per
+    STREAM_RECORD_COOLDOWN_SECONDS (bukan per track).
+    
+    Returns:
+        dict: event ('no_face', 'low_quality', 'unknown', 'ambiguous', 'recognized', atau 'busy')
+    """
+    session_id = stream.session_id
+    top_k, min_margin = get_recognition_params(params)
+    
+    try:
+        extract_result = inference_pool.run(
+            'extract_face_embedding',
+            image_data,
+            kiosk_id=params.get('kioskId'),
+            session_id=session_id,
+            roi_hint=get_roi_hint(params)
+        )
+    except PoolSaturated as e:
+        # Frame di-skip; frame berikutnya (yang terbaru) dicoba lagi
+        return {'type': 'busy', 'error': str(e)}
+    
+    if not extract_result.get('success') and extract_result.get('quality'):
+        # Face ada tapi quality terlalu rendah: kirim coaching ke kiosk
+        return {
+            'type': 'low_quality',
+            'bbox': extract_result.get('bbox'),
+            'quality': extract_result['quality']
+        }
+    
+    if not extract_result.get('success'):
+        return {
+            'type': 'no_face',
+            'face_detected': extract_result.get('face_detected', False),
+            'error': extract_result.get('error')
+        }
+    
+    detection = {
+        'face_detected': True,
+        'confidence': extract_result['confidence'],
+        'bbox': extract_result['bbox'],
+        'track': extract_result.get('track')
+    }
+    
+    result = recognize_tracked(extract_result, session_id, threshold=0.6, top_k=top_k, min_margin=min_margin)
+    
+    if not result.get('success'):
+        return {
+            'type': 'ambiguous' if result.get('ambiguous') else 'unknown',
+            'detection': detection,
+            'similarity': result.get('similarity', 0),
+            'threshold': 0.6,
+            'candidates': result.get('candidates', []),
+            'margin': result.get('margin')
+        }
+    
+    employee = result['employee']
+    employee['confidence'] = extract_result['confidence'] * 0.3 + employee['similarity'] * 0.7
+    event = {
+        'type': 'recognized',
+        'detection': detection,
+        'employee': employee,
+        'candidates': result.get('candidates', []),
+        'margin': result.get('margin'),
+        'attendance': None
+    }
+    
+    if str(params.get('recordAttendance', 'false')).lower() in ('true', '1'):
+        # Cooldown disimpan di manager per session id, jadi tetap berlaku setelah stream dibuka ulang
+        if scan_streams.claim_record(session_id, employee['employee_id']):
+            event['attendance'] = db.record_attendance_auto(
+                employee['employee_id'],
+                employee['confidence'],
+                employee=employee
+            )
+        else:
+            event['attendance_skipped'] = 'cooldown'
+    
+    return event
+
+scan_streams = ScanStreamManager(process_stream_frame)
+
+@app.route('/api/scan/stream/<session_id>/frames', methods=['POST'])
+def push_stream_frame(session_id):
+    """
+    Push satu camera frame ke scan stream (raw image/jpeg body direkomendasikan)
+    
+    Return langsung (202); hasil dikirim lewat /api/scan/stream/<session_id>/events.
+    Jika frame sebelumnya belum diproses, frame tersebut di-drop.
+    """
+    not_ready = face_engine_not_ready()
+    if not_ready:
+        return not_ready
+    
+    try:
+        data = get_face_request_data()
+        image_data = data.pop('image', None)
+        
+        if not image_data:
+            return jsonify({'success': False, 'error': 'No image provided'}), 400
+        
+        stream = scan_streams.get(session_id)
+        if stream is None:
+            response = jsonify({'success': False, 'error': 'Too many active scan streams'})
+            response.headers['Retry-After'] = str(FACE_ENGINE_RETRY_AFTER)
+            return response, 429
+        
+        dropped = stream.push_frame(image_data, data)
+        return jsonify({'success': True, 'accepted': True, 'dropped_previous': dropped}), 202
+        
+    except Exception as e:
+        print(f"❌ Stream frame error: {e}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/scan/stream/<session_id>/events', methods=['GET'])
+def stream_scan_events(session_id):
+    """Server-Sent Events: detection/recognition result untuk setiap frame yang diproses"""
+    stream = scan_streams.get(session_id)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Too many active scan streams'}), 429
+    
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('lastEventId', '0'))
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+    
+    return Response(
+        stream_with_context(stream.subscribe(last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/scan/stream/<session_id>', methods=['DELETE'])
+def close_scan_stream(session_id):
+    """Tutup scan stream (subscriber menerima 'closed' event)"""
+    if not scan_streams.close(session_id):
+        return jsonify({'success': False, 'error': 'Stream not found'}), 404
+    return jsonify({'success': True, 'message': f'Stream {session_id} closed'})
+
+@app.route('/api/scan/stream', methods=['GET'])
+def get_scan_streams():
+    """Frame received/dropped/processed counters per aktif stream"""
+    return jsonify(scan_streams.get_stats())
+
 # ==================== UTILITY ENDPOINTS ====================
 
 @app.route('/api/system/cleanup', methods=['POST'])
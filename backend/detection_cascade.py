@@ -0,0 +1,232 @@
+import os
+import threading
+from collections import deque
+import numpy as np
+
+
+# Minimal tinggi face (pixel di detector input) supaya tier kecil masih reliable
+MIN_FACE_PIXELS = int(os.getenv('FACE_CASCADE_MIN_FACE_PIXELS', '48'))
+
+# Jumlah face terakhir per kiosk yang dipakai untuk belajar preferred tier
+KIOSK_HISTORY = int(os.getenv('FACE_CASCADE_KIOSK_HISTORY', '20'))
+KIOSK_MIN_SAMPLES = 5
+
+# ROI detection: padding di sekitar roi_hint (fraksi dari ukuran hint) dan input size detector
+ROI_PADDING = float(os.getenv('FACE_ROI_PADDING', '0.5'))
+ROI_DET_SIZE = int(os.getenv('FACE_ROI_DET_SIZE', '160'))
+
+
+def size_label(det_size):
+    return f'{det_size[0]}x{det_size[1]}'
+
+
+class DetectionCascade:
+    """
+    Multi-resolution face detection
+
+    Detection dicoba dulu di input size terkecil (mis. 320x320) dan baru
+    fallback ke size lebih besar kalau tidak ada face yang lolos det_thresh.
+    Kalau kiosk_id diberikan, cascade belajar dari ukuran face terakhir di
+    kiosk tersebut dan langsung mulai dari tier yang cukup besar.
+    """
+
+    def __init__(self, det_model, det_sizes, min_face_pixels=MIN_FACE_PIXELS, kiosk_history=KIOSK_HISTORY):
+        self.det_model = det_model
+        self.det_sizes = sorted(det_sizes)
+        self.min_face_pixels = min_face_pixels
+        self.kiosk_history = kiosk_history
+
+        self._lock = threading.Lock()
+        self._attempts = [0] * len(self.det_sizes)
+        self._hits = [0] * len(self.det_sizes)
+        self._misses = 0
+        self._roi_attempts = 0
+        self._roi_hits = 0
+        self._kiosk_ratios = {}
+
+    def _start_tier(self, kiosk_id):
+        """Tier awal untuk kiosk ini berdasarkan median ukuran face terakhir"""
+        if kiosk_id is None:
+            return 0
+
+        ratios = self._kiosk_ratios.get(kiosk_id)
+        if not ratios or len(ratios) < KIOSK_MIN_SAMPLES:
+            return 0
+
+        face_ratio = float(np.median(ratios))
+        for tier, det_size in enumerate(self.det_sizes):
+            if face_ratio * max(det_size) >= self.min_face_pixels:
+                return tier
+        return len(self.det_sizes) - 1
+
+    def detect(self, image_np, kiosk_id=None, max_num=0):
+        """
+        Detect faces dengan cascade
+
+        Args:
+            image_np: BGR numpy array
+            kiosk_id: Optional kiosk/session id untuk preferred tier
+            max_num: Max faces (0 = semua)
+
+        Returns:
+            tuple: (bboxes [N, 5], kpss [N, 5, 2] atau None, det_size yang dipakai)
+        """
+        with self._lock:
+            start_tier = self._start_tier(kiosk_id)
+
+        bboxes, kpss = np.zeros((0, 5), dtype=np.float32), None
+        det_size = self.det_sizes[-1]
+
+        for tier in range(start_tier, len(self.det_sizes)):
+            det_size = self.det_sizes[tier]
+            bboxes, kpss = self.det_model.detect(image_np, input_size=det_size, max_num=max_num, metric='default')
+
+            with self._lock:
+                self._attempts[tier] += 1
+                if bboxes.shape[0] > 0:
+                    self._hits[tier] += 1
+
+            if bboxes.shape[0] > 0:
+                self._remember(kiosk_id, image_np, bboxes)
+                return bboxes, kpss, det_size
+
+        with self._lock:
+            self._misses += 1
+        return bboxes, kpss, det_size
+
+    def detect_roi(self, image_np, roi_hint, max_num=0, padding=ROI_PADDING, det_size=ROI_DET_SIZE):
+        """
+        Detect faces hanya di sekitar roi_hint (mis. bbox dari frame sebelumnya)
+
+        Region di-pad, di-crop, lalu di-detect di input size kecil.
+        Koordinat hasil di-map kembali ke image_np.
+
+        Args:
+            image_np: BGR numpy array
+            roi_hint: [x1, y1, x2, y2] di koordinat image_np
+            max_num: Max faces (0 = semua)
+
+        Returns:
+            tuple: (bboxes [N, 5], kpss [N, 5, 2] atau None), atau None jika
+            ROI tidak valid / tidak ada face (caller fallback ke detect())
+        """
+        height, width = image_np.shape[:2]
+        x1, y1, x2, y2 = [float(value) for value in roi_hint[:4]]
+        pad_x = (x2 - x1) * padding
+        pad_y = (y2 - y1) * padding
+        left, top = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+        right, bottom = min(width, int(x2 + pad_x)), min(height, int(y2 + pad_y))
+        if right - left < 16 or bottom - top < 16:
+            return None
+
+        crop = image_np[top:bottom, left:right]
+        bboxes, kpss = self.det_model.detect(crop, input_size=(det_size, det_size), max_num=max_num, metric='default')
+
+        with self._lock:
+            self._roi_attempts += 1
+            if bboxes.shape[0] > 0:
+                self._roi_hits += 1
+
+        if bboxes.shape[0] == 0:
+            return None
+
+        offset = np.array([left, top], dtype=bboxes.dtype)
+        bboxes[:, 0:2] += offset
+        bboxes[:, 2:4] += offset
+        if kpss is not None:
+            kpss = kpss + offset
+        return bboxes, kpss
+
+    def _remember(self, kiosk_id, image_np, bboxes):
+        """Simpan rasio ukuran face terbesar terhadap frame untuk kiosk ini"""
+        if kiosk_id is None:
+            return
+
+        heights = bboxes[:, 3] - bboxes[:, 1]
+        widths = bboxes[:, 2] - bboxes[:, 0]
+        face_ratio = float(np.max(np.maximum(heights, widths))) / max(image_np.shape[:2])
+
+        with self._lock:
+            ratios = self._kiosk_ratios.get(kiosk_id)
+            if ratios is None:
+                ratios = self._kiosk_ratios[kiosk_id] = deque(maxlen=self.kiosk_history)
+            ratios.append(face_ratio)
+
+    def get_stats(self):
+        """Per-tier attempts, hits dan hit rate"""
+        with self._lock:
+            total_scans = sum(self._hits) + self._misses
+            tiers = []
+            for tier, det_size in enumerate(self.det_sizes):
+                attempts = self._attempts[tier]
+                hits = self._hits[tier]
+                tiers.append({
+                    'det_size': size_label(det_size),
+                    'attempts': attempts,
+                    'hits': hits,
+                    'hit_rate': round(hits / attempts, 4) if attempts else 0.0,
+                    'share_of_scans': round(hits / total_scans, 4) if total_scans else 0.0
+                })
+
+            return {
+                'tiers': tiers,
+                'total_scans': total_scans,
+                'misses': self._misses,
+                'roi': {
+                    'det_size': size_label((ROI_DET_SIZE, ROI_DET_SIZE)),
+                    'attempts': self._roi_attempts,
+                    'hits': self._roi_hits,
+                    'hit_rate': round(self._roi_hits / self._roi_attempts, 4) if self._roi_attempts else 0.0
+                },
+                'kiosks': {
+                    kiosk_id: size_label(self.det_sizes[self._start_tier(kiosk_id)])
+                    for kiosk_id in self._kiosk_ratios
+                }
+            }
+
+
+def merge_cascade_stats(stats_list):
+    """
+    Gabungkan get_stats() dari beberapa cascade (satu per engine di inference pool)
+
+    Counter dijumlah per det size lalu rate dihitung ulang. Kiosk learning
+    tetap per engine; untuk kiosk yang dikenal beberapa engine dipakai tier terbesar.
+    """
+    stats_list = [stats for stats in stats_list if stats]
+    if not stats_list:
+        return None
+
+    tiers = {}
+    for stats in stats_list:
+        for tier in stats['tiers']:
+            merged = tiers.setdefault(tier['det_size'], {'det_size': tier['det_size'], 'attempts': 0, 'hits': 0})
+            merged['attempts'] += tier['attempts']
+            merged['hits'] += tier['hits']
+
+    total_scans = sum(stats['total_scans'] for stats in stats_list)
+    for tier in tiers.values():
+        tier['hit_rate'] = round(tier['hits'] / tier['attempts'], 4) if tier['attempts'] else 0.0
+        tier['share_of_scans'] = round(tier['hits'] / total_scans, 4) if total_scans else 0.0
+
+    roi_attempts = sum(stats['roi']['attempts'] for stats in stats_list)
+    roi_hits = sum(stats['roi']['hits'] for stats in stats_list)
+
+    kiosks = {}
+    for stats in stats_list:
+        for kiosk_id, label in stats['kiosks'].items():
+            if kiosk_id not in kiosks or int(label.split('x')[0]) > int(kiosks[kiosk_id].split('x')[0]):
+                kiosks[kiosk_id] = label
+
+    return {
+        'tiers': list(tiers.values()),
+        'total_scans': total_scans,
+        'misses': sum(stats['misses'] for stats in stats_list),
+        'roi': {
+            'det_size': stats_list[0]['roi']['det_size'],
+            'attempts': roi_attempts,
+            'hits': roi_hits,
+            'hit_rate': round(roi_hits / roi_attempts, 4) if roi_attempts else 0.0
+        },
+        'kiosks': kiosks,
+        'engines': len(stats_list)
+    }
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+
+# Cache on/off
+CACHE_ENABLED = os.getenv('FACE_EMBEDDING_CACHE', 'true').lower() == 'true'
+
+# Max entries (LRU) dan umur entry (detik)
+CACHE_MAX_ENTRIES = int(os.getenv('FACE_EMBEDDING_CACHE_SIZE', '1024'))
+CACHE_TTL_SECONDS = float(os.getenv('FACE_EMBEDDING_CACHE_TTL_SECONDS', '300'))
+
+
+def image_digest(image_data):
+    """
+    Content hash dari image (bytes yang sudah di-decode dari base64, atau pixel data)
+
+    Returns:
+        str: blake2b hex digest, atau None jika tipe image tidak didukung
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        digest.update(image_data)
+    elif isinstance(image_data, np.ndarray):
+        digest.update(f'{image_data.shape}{image_data.dtype}'.encode())
+        digest.update(np.ascontiguousarray(image_data).data)
+    elif isinstance(image_data, Image.Image):
+        digest.update(f'{image_data.mode}{image_data.size}'.encode())
+        digest.update(image_data.tobytes())
+    else:
+        return None
+
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache dengan TTL untuk hasil extraction
+
+    Key berisi content hash image + engine version tag, jadi request retry
+    atau verifikasi ulang dengan bytes yang sama tidak menjalankan
+    detection/recognition lagi.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+
+    def get(self, key):
+        """Return cached value, atau None (miss / expired)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            stored_at, value = entry
+            if now - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._expired += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expired': self._expired
+            }
+
+
+# Global cache, dipakai bersama oleh semua pool engines
+embedding_cache = EmbeddingCache() if CACHE_ENABLED else None
@@ -0,0 +1,128 @@
+import base64
+import os
+import numpy as np
+
+
+# Wire format untuk embedding:
+#   legacy  -> JSON list of floats [512]
+#   compact -> {'version': 1, 'dtype': 'float32' | 'float16', 'dim': 512, 'data': '<base64 little-endian>'}
+EMBEDDING_WIRE_VERSION = 1
+EMBEDDING_FORMATS = {
+    'json': None,
+    'float32': '<f4',
+    'float16': '<f2',
+}
+
+# Storage format template di collection face_templates:
+#   {'employee_id', 'dim', 'count', 'dtype', 'model_version', 'data': <packed little-endian matrix>}
+TEMPLATE_DTYPE = os.getenv('FACE_TEMPLATE_DTYPE', 'float32')
+
+# Model yang menghasilkan template, ditentukan dari dimensi
+TEMPLATE_MODEL_VERSIONS = {
+    512: os.getenv('FACE_TEMPLATE_MODEL_VERSION', 'buffalo_l'),
+    128: 'legacy_128',  # DeepFace / face_recognition era
+}
+
+
+def decode_embedding(payload):
+    """
+    Decode embedding dari request (legacy JSON list atau compact base64)
+
+    Args:
+        payload: List of floats, numpy array, atau compact dict
+
+    Returns:
+        numpy array float32 [N]
+    """
+    if isinstance(payload, dict):
+        version = payload.get('version')
+        if version != EMBEDDING_WIRE_VERSION:
+            raise ValueError(f"Unsupported embedding version: {version}")
+
+        dtype = EMBEDDING_FORMATS.get(payload.get('dtype'))
+        if dtype is None:
+            raise ValueError(f"Unsupported embedding dtype: {payload.get('dtype')}")
+
+        embedding = np.frombuffer(base64.b64decode(payload.get('data', '')), dtype=dtype)
+        if 'dim' in payload and embedding.shape[0] != int(payload['dim']):
+            raise ValueError(f"Embedding dim mismatch: header {payload['dim']}, data {embedding.shape[0]}")
+        return embedding.astype(np.float32)
+
+    if isinstance(payload, (list, tuple, np.ndarray)):
+        embedding = np.asarray(payload, dtype=np.float32)
+        if embedding.ndim != 1:
+            raise ValueError(f"Embedding must be 1-D, got shape {embedding.shape}")
+        return embedding
+
+    raise ValueError(f"Unsupported embedding payload: {type(payload)}")
+
+
+def encode_embedding(embedding, embedding_format='json'):
+    """
+    Encode float32 embedding untuk response
+
+    Args:
+        embedding: numpy array [N]
+        embedding_format: 'json' (default, list of floats), 'float32', atau 'float16'
+
+    Returns:
+        list atau compact dict
+    """
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise ValueError(f"Unsupported embedding format: {embedding_format}")
+
+    embedding = np.asarray(embedding, dtype=np.float32)
+    dtype = EMBEDDING_FORMATS[embedding_format]
+    if dtype is None:
+        return embedding.tolist()
+
+    return {
+        'version': EMBEDDING_WIRE_VERSION,
+        'dtype': embedding_format,
+        'dim': int(embedding.shape[0]),
+        'data': base64.b64encode(embedding.astype(dtype).tobytes()).decode('ascii')
+    }
+
+
+def pack_templates(templates, dtype=TEMPLATE_DTYPE, model_version=None):
+    """
+    Pack template dengan dimensi yang sama jadi satu binary blob
+
+    Args:
+        templates: Array-like [count, dim]
+        dtype: 'float32' atau 'float16'
+        model_version: Optional, default dari TEMPLATE_MODEL_VERSIONS
+
+    Returns:
+        dict: fields untuk template document (data berupa bytes)
+    """
+    storage_dtype = EMBEDDING_FORMATS.get(dtype)
+    if storage_dtype is None:
+        raise ValueError(f"Unsupported template dtype: {dtype}")
+
+    matrix = np.asarray(templates, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    if matrix.ndim != 2 or matrix.shape[0] == 0:
+        raise ValueError(f"Templates must be [count, dim], got shape {matrix.shape}")
+
+    dim = int(matrix.shape[1])
+    return {
+        'dim': dim,
+        'count': int(matrix.shape[0]),
+        'dtype': dtype,
+        'model_version': model_version or TEMPLATE_MODEL_VERSIONS.get(dim, 'unknown'),
+        'data': matrix.astype(storage_dtype).tobytes()
+    }
+
+
+def unpack_templates(document):
+    """
+    Unpack template document jadi float32 matrix [count, dim]
+    """
+    storage_dtype = EMBEDDING_FORMATS.get(document.get('dtype'))
+    if storage_dtype is None:
+        raise ValueError(f"Unsupported template dtype: {document.get('dtype')}")
+
+    matrix = np.frombuffer(document['data'], dtype=storage_dtype)
+    return matrix.reshape(int(document['count']), int(document['dim'])).astype(np.float32)
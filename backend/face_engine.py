@@ -1,95 +1,435 @@
 import insightface
+from insightface.app.common import Face
+from insightface.utils import face_align
 import cv2
 import numpy as np
 from datetime import datetime
 import base64
 from PIL import Image
 import io
+import os
+import threading
+import time
 import traceback
 
+from detection_cascade import DetectionCascade
+from face_quality import assess_face_quality, QUALITY_GATE_ENABLED
+from embedding_cache import image_digest
+from ort_config import load_engine_config, model_session_options, create_session
+from quantization import ensure_quantized_model
+
+# Max jumlah aligned crops per satu recognition inference (batched registration)
+REC_MAX_BATCH_SIZE = int(os.getenv('FACE_REC_MAX_BATCH_SIZE', '16'))
+
+# Detection cascade input sizes (kecil -> besar), format "320,640"
+DET_SIZES = [
+    (int(size), int(size))
+    for size in os.getenv('FACE_DET_SIZES', '320,640').split(',')
+    if size.strip()
+]
+
+# Reduced-resolution JPEG decode tidak akan membuat long side lebih kecil dari ini
+# (0 = 2x detector input terbesar, mis. 1280 untuk FACE_DET_SIZES=320,640)
+DECODE_MIN_LONG_SIDE = int(os.getenv('FACE_DECODE_MIN_LONG_SIDE', '0'))
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Pipeline profiles -> InsightFace allowed_modules (None = semua model di pack)
+PIPELINE_PROFILES = {
+    'attendance': ['detection', 'recognition'],
+    'full': None,
+    'detect-only': ['detection'],
+}
+PIPELINE_PROFILE = os.getenv('FACE_PIPELINE_PROFILE', 'attendance')
+
+# Model yang dijalankan dalam INT8, mis. "recognition" atau "recognition,detection"
+QUANTIZE_MODELS = tuple(
+    taskname.strip()
+    for taskname in os.getenv('FACE_QUANTIZE', '').split(',')
+    if taskname.strip()
+)
+
+# Jumlah iterasi self-benchmark setelah warm-up (0 = disabled)
+BENCHMARK_ITERATIONS = int(os.getenv('FACE_ENGINE_BENCHMARK_ITERATIONS', '10'))
+
+# Load model di background thread supaya import app.py tidak block
+LOAD_IN_BACKGROUND = os.getenv('FACE_ENGINE_BACKGROUND_LOAD', 'true').lower() == 'true'
+
+# Engine lifecycle states
+STATE_LOADING = 'loading'
+STATE_WARMING = 'warming'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
 class FaceEngine:
-    def __init__(self):
+    def __init__(self, rec_max_batch_size=REC_MAX_BATCH_SIZE, det_sizes=None, profile=PIPELINE_PROFILE,
+                 quantize=QUANTIZE_MODELS, quality_gate=QUALITY_GATE_ENABLED, background=False):
+        if profile not in PIPELINE_PROFILES:
+            print(f"⚠️ Unknown pipeline profile '{profile}', using 'attendance'")
+            profile = 'attendance'
+        
         self.model = None
-        self.load_model()
+        self.profile = profile
+        self.quantize = tuple(quantize)
+        self.cascade = None
+        self.batcher = None
+        self.tracker = None
+        self.cache = None
+        self.quality_gate = quality_gate
+        self.quality_rejections = {}
+        self.rec_max_batch_size = max(1, int(rec_max_batch_size))
+        self.det_sizes = list(det_sizes or DET_SIZES)
+        self.decode_min_long_side = DECODE_MIN_LONG_SIDE or 2 * max(max(size) for size in self.det_sizes)
+        self.state = STATE_LOADING
+        self.error = None
+        self.load_time_ms = None
+        self.warmup_ms = {}
+        self.benchmark_ms = {}
+        self.ort_config = None
+        self._settled = threading.Event()
+        
+        if background:
+            threading.Thread(target=self.start, name='face-engine-loader', daemon=True).start()
+        else:
+            self.start()
+    
+    @property
+    def has_recognition(self):
+        return self.model is not None and 'recognition' in self.model.models
+    
+    @property
+    def is_ready(self):
+        return self.state == STATE_READY
+    
+    def wait_until_ready(self, timeout=None):
+        """Block sampai engine ready atau failed. Return True jika ready."""
+        self._settled.wait(timeout)
+        return self.is_ready
+    
+    def start(self):
+        """Load model lalu warm-up: loading -> warming -> ready (atau failed)"""
+        try:
+            self.state = STATE_LOADING
+            started = time.perf_counter()
+            self.load_model()
+            
+            if self.model is None:
+                self.state = STATE_FAILED
+                return
+            
+            self.load_time_ms = round((time.perf_counter() - started) * 1000, 1)
+            
+            self.state = STATE_WARMING
+            self.warm_up()
+            if BENCHMARK_ITERATIONS > 0:
+                self.benchmark(BENCHMARK_ITERATIONS)
+            self.state = STATE_READY
+            print(f"✅ Face engine ready (load {self.load_time_ms} ms, warm-up {self.warmup_ms})")
+            
+        except Exception as e:
+            print(f"❌ Face engine warm-up failed: {e}")
+            traceback.print_exc()
+            self.error = str(e)
+            self.state = STATE_FAILED
+        finally:
+            self._settled.set()
     
     def load_model(self):
         """Load InsightFace model"""
         try:
-            print("🚀 Loading InsightFace model (buffalo_l)...")
+            print(f"🚀 Loading InsightFace model (buffalo_l, profile: {self.profile})...")
+            self.ort_config = load_engine_config()
             self.model = insightface.app.FaceAnalysis(
                 name='buffalo_l',
-                providers=['CPUExecutionProvider']
+                allowed_modules=PIPELINE_PROFILES[self.profile],
+                providers=self.ort_config['providers']
             )
-            self.model.prepare(ctx_id=0, det_size=(640, 640))
+            self._configure_sessions()
+            self.model.prepare(ctx_id=0, det_size=max(self.det_sizes))
+            self.cascade = DetectionCascade(self.model.det_model, self.det_sizes)
             print("✅ Face recognition model loaded successfully")
             print("📊 Model: buffalo_l (InsightFace)")
+            print(f"🧩 Modules: {', '.join(self.model.models.keys())}")
             print("📐 Embedding size: 512 dimensions")
         except Exception as e:
             print(f"❌ Error loading face model: {e}")
             traceback.print_exc()
+            self.error = str(e)
             self.model = None
     
+    def _configure_sessions(self):
+        """
+        Recreate session setiap model dengan session options eksplisit
+        
+        InsightFace model_zoo hanya meneruskan providers, jadi thread count,
+        graph optimization, memory arena, dll di-set di sini per model.
+        Model di self.quantize di-load dari INT8 file (dibuat sekali jika belum ada).
+        """
+        for taskname, model in self.model.models.items():
+            options = model_session_options(self.ort_config, taskname)
+            model_file = model.model_file
+            
+            if taskname in self.quantize:
+                model_file = ensure_quantized_model(model.model_file)
+            
+            model.session = create_session(model_file, options, self.ort_config['providers'])
+            print(f"⚙️ {taskname}: {os.path.basename(model_file)} on {model.session.get_providers()[0]}, "
+                  f"intra_op={options['intra_op_num_threads']}, inter_op={options['inter_op_num_threads']}, "
+                  f"opt={options['graph_optimization_level']}")
+    
+    def warm_up(self):
+        """
+        Jalankan dummy inference supaya ONNX Runtime graph optimization dan
+        memory allocation tidak dibayar oleh request pertama
+        
+        Detection di-warm-up per configured det size, lalu semua model
+        lain (recognition, landmarks, ...) dengan satu synthetic face.
+        """
+        for det_size in self.det_sizes:
+            dummy = np.zeros((det_size[1], det_size[0], 3), dtype=np.uint8)
+            started = time.perf_counter()
+            self.model.det_model.detect(dummy, input_size=det_size, max_num=0, metric='default')
+            self.warmup_ms[f'detection_{det_size[0]}x{det_size[1]}'] = round((time.perf_counter() - started) * 1000, 1)
+        
+        dummy = np.zeros((256, 256, 3), dtype=np.uint8)
+        synthetic_face = Face(
+            bbox=np.array([16, 16, 128, 128], dtype=np.float32),
+            kps=face_align.arcface_dst + 16,
+            det_score=1.0
+        )
+        for taskname, model in self.model.models.items():
+            if taskname == 'detection':
+                continue
+            started = time.perf_counter()
+            model.get(dummy, synthetic_face)
+            self.warmup_ms[taskname] = round((time.perf_counter() - started) * 1000, 1)
+    
+    def _decode_bytes(self, image_bytes):
+        """
+        Decode JPEG/PNG bytes langsung ke BGR array (satu langkah, tanpa PIL copy)
+        
+        JPEG yang jauh lebih besar dari yang dibutuhkan di-decode di 1/2, 1/4
+        atau 1/8 resolusi (DCT scaling libjpeg), selama long side tetap
+        >= decode_min_long_side.
+        
+        Default floor = 2x detector input terbesar (1280 untuk det size 640),
+        jadi frame webcam 1280x720 dari registration tetap di-decode penuh dan
+        face crop untuk recognition / quality gate tidak kehilangan pixel;
+        hanya foto kamera besar (mis. 4000x3000) yang di-decode lebih kecil.
+        
+        Returns:
+            tuple: (numpy array BGR, scale factor ke koordinat asli)
+        """
+        flags, scale = cv2.IMREAD_COLOR, 1
+        
+        if image_bytes[:2] == b'\xff\xd8':
+            # PIL hanya membaca header di sini, pixel tidak di-decode
+            long_side = max(Image.open(io.BytesIO(image_bytes)).size)
+            for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+                if long_side / factor >= self.decode_min_long_side:
+                    flags, scale = reduced_flag, factor
+                    break
+        
+        # PIL path lama tidak menerapkan EXIF orientation, jadi tetap diabaikan
+        image_np = cv2.imdecode(
+            np.frombuffer(image_bytes, dtype=np.uint8),
+            flags | cv2.IMREAD_IGNORE_ORIENTATION
+        )
+        if image_np is None:
+            raise ValueError("Unable to decode image bytes (expected JPEG or PNG)")
+        
+        return image_np, scale
+    
+    @staticmethod
+    def _base64_bytes(image_data):
+        """Base64 string / data URL -> raw image bytes"""
+        _, _, payload = image_data.rpartition('base64,')
+        return base64.b64decode(payload)
+    
+    def _cache_key(self, kind, image_data, *params):
+        """
+        Content-addressed cache key: (kind, hash image bytes, engine version, params)
+        
+        Return (key, image_data); base64 string di-decode sekali ke bytes
+        supaya request JSON dan multipart dengan image yang sama share entry.
+        """
+        if self.cache is None:
+            return None, image_data
+        if isinstance(image_data, str):
+            image_data = self._base64_bytes(image_data)
+        digest = image_digest(image_data)
+        if digest is None:
+            return None, image_data
+        return (kind, digest, self.version_tag) + params, image_data
+    
+    @property
+    def version_tag(self):
+        """Engine config yang mempengaruhi hasil extraction (bagian dari cache key)"""
+        return (
+            'buffalo_l', self.profile, self.quantize, tuple(self.det_sizes),
+            self.quality_gate, self.decode_min_long_side
+        )
+    
+    def _decode(self, image_data):
+        """
+        Decode image dan return (BGR array, scale factor ke koordinat asli)
+        
+        Color order ditentukan dari tipe input: bytes/base64 di-decode oleh
+        OpenCV (sudah BGR), numpy array dan PIL Image dianggap RGB.
+        """
+        if isinstance(image_data, str):
+            return self._decode_bytes(self._base64_bytes(image_data))
+        
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            return self._decode_bytes(bytes(image_data))
+        
+        if isinstance(image_data, Image.Image):
+            if image_data.mode != 'RGB':
+                image_data = image_data.convert('RGB')
+            image_np = np.asarray(image_data)
+        elif isinstance(image_data, np.ndarray):
+            image_np = image_data
+        else:
+            raise ValueError(f"Unsupported image type: {type(image_data)}")
+        
+        if image_np.ndim == 3 and image_np.shape[2] == 4:
+            return cv2.cvtColor(image_np, cv2.COLOR_RGBA2BGR), 1
+        if image_np.ndim == 3 and image_np.shape[2] == 3:
+            return cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR), 1
+        if image_np.ndim == 2:
+            return cv2.cvtColor(image_np, cv2.COLOR_GRAY2BGR), 1
+        return image_np, 1
+    
     def decode_image(self, image_data):
         """
         Decode image dari berbagai format
         
         Args:
-            image_data: base64 string, numpy array, atau PIL Image
+            image_data: base64 string, raw JPEG/PNG bytes, numpy array (RGB), atau PIL Image
             
         Returns:
             numpy array (BGR format untuk OpenCV)
         """
         try:
-            if isinstance(image_data, str):
-                # Base64 string
-                if 'base64,' in image_data:
-                    image_data = image_data.split('base64,')[1]
-                
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-                image_np = np.array(image)
-                
-            elif isinstance(image_data, np.ndarray):
-                image_np = image_data
-                
-            elif isinstance(image_data, Image.Image):
-                image_np = np.array(image_data)
-                
-            else:
-                raise ValueError(f"Unsupported image type: {type(image_data)}")
-            
-            # Convert RGB to BGR untuk OpenCV/InsightFace
-            if len(image_np.shape) == 3 and image_np.shape[2] == 3:
-                # Check if already BGR or RGB
-                if image_np.max() > 1.0:  # Assume 0-255 range
-                    image_np = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
-            elif len(image_np.shape) == 3 and image_np.shape[2] == 4:
-                # RGBA to BGR
-                image_np = cv2.cvtColor(image_np, cv2.COLOR_RGBA2BGR)
-            
-            return image_np
+            return self._decode(image_data)[0]
             
         except Exception as e:
             print(f"❌ Error decoding image: {e}")
             traceback.print_exc()
             raise
     
-    def extract_face_embedding(self, image_data):
+    @staticmethod
+    def _measure_ms(fn, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'p50': round(float(np.percentile(timings, 50)), 2),
+            'p95': round(float(np.percentile(timings, 95)), 2)
+        }
+    
+    def benchmark(self, iterations=BENCHMARK_ITERATIONS):
+        """
+        Self-benchmark untuk ONNX Runtime settings yang aktif
+        
+        Returns:
+            dict: {'detection_320x320': {'p50': ms, 'p95': ms}, ..., 'recognition': {...}}
+        """
+        results = {}
+        
+        for det_size in self.det_sizes:
+            dummy = np.zeros((det_size[1], det_size[0], 3), dtype=np.uint8)
+            results[f'detection_{det_size[0]}x{det_size[1]}'] = self._measure_ms(
+                lambda: self.model.det_model.detect(dummy, input_size=det_size, max_num=0, metric='default'),
+                iterations
+            )
+        
+        if self.has_recognition:
+            rec_model = self.model.models['recognition']
+            crop = np.zeros((rec_model.input_size[1], rec_model.input_size[0], 3), dtype=np.uint8)
+            results['recognition'] = self._measure_ms(lambda: rec_model.get_feat([crop]), iterations)
+        
+        self.benchmark_ms = results
+        print(f"⏱️ Self-benchmark ({iterations} iterations): {results}")
+        return results
+    
+    def _analyze_face(self, image_np, bbox, kps, det_score):
+        """
+        Jalankan semua model selain detection (recognition, landmarks, ...) untuk satu face
+        
+        Jika batcher di-set, recognition crop dikirim ke shared micro-batcher
+        supaya request yang bersamaan diproses dalam satu inference.
+        """
+        face = Face(bbox=bbox, kps=kps, det_score=det_score)
+        for taskname, model in self.model.models.items():
+            if taskname == 'detection':
+                continue
+            if taskname == 'recognition' and self.batcher is not None and kps is not None:
+                aligned_face = face_align.norm_crop(image_np, landmark=kps, image_size=model.input_size[0])
+                face.embedding = self.batcher.embed(aligned_face).flatten()
+                continue
+            model.get(image_np, face)
+        return face
+    
+    def _get_faces(self, image_np, kiosk_id=None):
+        """Pengganti FaceAnalysis.get() yang memakai detection cascade"""
+        bboxes, kpss, _ = self.cascade.detect(image_np, kiosk_id=kiosk_id)
+        return [
+            self._analyze_face(
+                image_np,
+                bboxes[i, 0:4],
+                kpss[i] if kpss is not None else None,
+                bboxes[i, 4]
+            )
+            for i in range(bboxes.shape[0])
+        ]
+    
+    def extract_face_embedding(self, image_data, kiosk_id=None, session_id=None, roi_hint=None):
         """
         Extract face embedding dari single image (UNTUK FRONTEND)
         
         Args:
             image_data: Base64 string, numpy array, atau PIL Image
+            kiosk_id: Optional kiosk/session id untuk preferred detection tier
+            session_id: Optional scan session id; jika tracker aktif, embedding
+                        dari frame sebelumnya dipakai ulang selama face yang sama
+            roi_hint: Optional [x1, y1, x2, y2] (mis. bbox dari response sebelumnya)
+                      di koordinat image asli untuk ROI detection
             
         Returns:
             dict: {
                 'success': True,
-                'embedding': [512 dimensions],
+                'embedding': numpy float32 array [512],
                 'confidence': float (0-1),
                 'face_detected': True,
-                'bbox': [x1, y1, x2, y2]
+                'bbox': [x1, y1, x2, y2],
+                'quality': {'passed', 'reasons', 'messages', 'metrics'} atau None,
+                'track': {'track_id', 'reused', 'frames'} (hanya jika session_id dipakai),
+                'cached': True (hanya jika hasil dari embedding cache)
             }
         """
+        # Cache dipakai untuk request tanpa session (retry, verify); tracked frames pakai tracker
+        key = None
+        if session_id is None:
+            key, image_data = self._cache_key('extract', image_data, tuple(roi_hint or ()))
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                print("⚡ Embedding cache hit")
+                return dict(cached, cached=True)
+        
+        result = self._extract_face_embedding(image_data, kiosk_id, session_id, roi_hint)
+        
+        if key is not None and result.get('success'):
+            # Copy: caller boleh mengubah result tanpa merusak cache entry
+            self.cache.put(key, dict(result))
+        return result
+    
+    def _extract_face_embedding(self, image_data, kiosk_id, session_id, roi_hint):
         if self.model is None:
             return {
                 'success': False,
@@ -98,15 +438,17 @@ class FaceEngine:
             }
         
         try:
-            # Decode image
-            image_np = self.decode_image(image_data)
+            # Decode image (scale != 1 jika JPEG di-decode di resolusi lebih kecil)
+            image_np, scale = self._decode(image_data)
             
-            print(f"📸 Processing image shape: {image_np.shape}")
+            print(f"📸 Processing image shape: {image_np.shape} (decode scale 1/{scale})")
             
-            # Detect faces menggunakan InsightFace
-            faces = self.model.get(image_np)
+            # Detect faces (ROI atau cascade), ambil face terbesar
+            if roi_hint is not None:
+                roi_hint = [float(value) / scale for value in roi_hint[:4]]
+            detection = self._detect_primary_face(image_np, kiosk_id=kiosk_id, roi_hint=roi_hint)
             
-            if len(faces) == 0:
+            if detection is None:
                 print("⚠️ No face detected in image")
                 return {
                     'success': False,
@@ -114,36 +456,74 @@ class FaceEngine:
                     'face_detected': False
                 }
             
-            # Ambil face terbesar (atau terdekat ke center)
-            # Sort by bbox area
-            faces = sorted(faces, key=lambda x: (x.bbox[2] - x.bbox[0]) * (x.bbox[3] - x.bbox[1]), reverse=True)
-            face = faces[0]
+            bbox = (detection[0] * scale).tolist()
+            confidence = float(detection[2])  # Detection confidence
+            tracking = self.tracker is not None and session_id is not None and self.has_recognition
+            
+            # Face yang sama dengan frame sebelumnya: skip recognition model
+            track = self.tracker.lookup(session_id, bbox, confidence) if tracking else None
+            if track is not None:
+                print(f"♻️ Reusing embedding from track {track.track_id} (frame {track.frames})")
+                return {
+                    'success': True,
+                    'embedding': track.embedding,
+                    'confidence': confidence,
+                    'face_detected': True,
+                    'bbox': bbox,
+                    'track': {'track_id': track.track_id, 'reused': True, 'frames': track.frames}
+                }
+            
+            # Quality gate: frame yang blur/kecil/miring/gelap tidak perlu di-embed
+            quality = None
+            if self.quality_gate:
+                quality = assess_face_quality(image_np, detection[0], detection[1])
+                if not quality['passed']:
+                    for reason in quality['reasons']:
+                        self.quality_rejections[reason] = self.quality_rejections.get(reason, 0) + 1
+                    print(f"⚠️ Face rejected by quality gate: {quality['reasons']}")
+                    return {
+                        'success': False,
+                        'error': f"Face quality too low: {', '.join(quality['messages'])}",
+                        'face_detected': True,
+                        'bbox': bbox,
+                        'confidence': confidence,
+                        'quality': quality
+                    }
+            
+            # Recognition cukup dijalankan untuk face terbesar saja
+            face = self._analyze_face(image_np, *detection)
             
             if face.embedding is None:
                 return {
                     'success': False,
-                    'error': 'Failed to extract face embedding',
+                    'error': 'Failed to extract face embedding' if self.has_recognition
+                             else f"Recognition disabled by pipeline profile '{self.profile}'",
                     'face_detected': True
                 }
             
-            # Get embedding dan normalize
-            embedding = face.embedding.tolist()
-            confidence = float(face.det_score)  # Detection confidence
-            bbox = face.bbox.tolist()
+            # Embedding tetap float32 array di backend, serialisasi di API boundary
+            embedding = face.embedding.astype(np.float32)
             
             print(f"✅ Face embedding extracted successfully")
             print(f"   Embedding length: {len(embedding)}")
             print(f"   Detection confidence: {confidence:.3f}")
             print(f"   Bbox: {bbox}")
             
-            return {
+            result = {
                 'success': True,
                 'embedding': embedding,
                 'confidence': confidence,
                 'face_detected': True,
-                'bbox': bbox
+                'bbox': bbox,
+                'quality': quality
             }
             
+            if tracking:
+                track = self.tracker.update(session_id, bbox, confidence, embedding)
+                result['track'] = {'track_id': track.track_id, 'reused': False, 'frames': track.frames}
+            
+            return result
+            
         except Exception as e:
             print(f"❌ Error extracting face embedding: {e}")
             traceback.print_exc()
@@ -153,35 +533,136 @@ class FaceEngine:
                 'face_detected': False
             }
     
+    def _detect_primary_face(self, image_np, kiosk_id=None, roi_hint=None):
+        """
+        Detect faces dan ambil face terbesar (tanpa menjalankan recognition)
+        
+        Args:
+            roi_hint: Optional [x1, y1, x2, y2] di koordinat image_np; detection
+                      dicoba dulu di sekitar region ini, fallback ke full frame
+        
+        Returns:
+            tuple: (bbox, kps, det_score) atau None jika tidak ada face
+        """
+        roi_result = self.cascade.detect_roi(image_np, roi_hint) if roi_hint is not None else None
+        if roi_result is not None:
+            bboxes, kpss = roi_result
+        else:
+            bboxes, kpss, _ = self.cascade.detect(image_np, kiosk_id=kiosk_id)
+        
+        if bboxes.shape[0] == 0:
+            return None
+        
+        areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+        idx = int(np.argmax(areas))
+        kps = kpss[idx] if kpss is not None else None
+        return bboxes[idx, 0:4], kps, float(bboxes[idx, 4])
+    
+    def _embed_aligned_faces(self, aligned_faces):
+        """
+        Jalankan recognition model atas aligned crops secara batched
+        
+        Args:
+            aligned_faces: List of aligned face crops (BGR, input_size recognition model)
+            
+        Returns:
+            numpy array [N, 512]
+        """
+        rec_model = self.model.models['recognition']
+        features = []
+        
+        for start in range(0, len(aligned_faces), self.rec_max_batch_size):
+            batch = aligned_faces[start:start + self.rec_max_batch_size]
+            features.append(rec_model.get_feat(batch))
+        
+        return np.concatenate(features, axis=0)
+    
     def extract_multiple_embeddings(self, image_data_list):
         """
         Extract embeddings dari multiple images (UNTUK REGISTRATION)
         
+        Semua image di-detect dan di-align dulu, lalu recognition model
+        dijalankan sekali per batch (max rec_max_batch_size crops).
+        
         Args:
             image_data_list: List of image data (base64, numpy, or PIL)
             
         Returns:
             dict: {
                 'success': True,
-                'embeddings': [[512], [512], ...],
+                'embeddings': [float32 array [512], ...],
                 'count': int,
                 'avg_confidence': float
             }
         """
+        if self.model is None:
+            return {
+                'success': False,
+                'error': 'Face model not loaded'
+            }
+        
+        if not self.has_recognition:
+            return {
+                'success': False,
+                'error': f"Recognition disabled by pipeline profile '{self.profile}'"
+            }
+        
         try:
-            embeddings = []
+            rec_model = self.model.models['recognition']
+            aligned_faces = []
             confidences = []
             
+            embeddings = [None] * len(image_data_list)
+            cache_keys = [None] * len(image_data_list)
+            aligned_index = []
+            
             for idx, image_data in enumerate(image_data_list):
-                print(f"🔄 Processing image {idx + 1}/{len(image_data_list)}...")
+                try:
+                    cache_keys[idx], image_data = self._cache_key('register', image_data)
+                except Exception as e:
+                    print(f"⚠️ Failed to process image {idx + 1}: {e}")
+                    continue
+                
+                cached = self.cache.get(cache_keys[idx]) if cache_keys[idx] else None
+                if cached is not None:
+                    print(f"⚡ Image {idx + 1}/{len(image_data_list)}: embedding cache hit")
+                    embeddings[idx], det_score = cached
+                    confidences.append(det_score)
+                    continue
+                
+                print(f"🔄 Detecting face in image {idx + 1}/{len(image_data_list)}...")
                 
-                result = self.extract_face_embedding(image_data)
+                try:
+                    image_np = self.decode_image(image_data)
+                    detection = self._detect_primary_face(image_np)
+                except Exception as e:
+                    print(f"⚠️ Failed to process image {idx + 1}: {e}")
+                    continue
                 
-                if result.get('success'):
-                    embeddings.append(result['embedding'])
-                    confidences.append(result['confidence'])
-                else:
-                    print(f"⚠️ Failed to extract embedding from image {idx + 1}: {result.get('error')}")
+                if detection is None:
+                    print(f"⚠️ Failed to extract embedding from image {idx + 1}: No face detected in image")
+                    continue
+                
+                bbox, kps, det_score = detection
+                if kps is None:
+                    print(f"⚠️ Failed to extract embedding from image {idx + 1}: No landmarks for alignment")
+                    continue
+                
+                aligned_faces.append(
+                    face_align.norm_crop(image_np, landmark=kps, image_size=rec_model.input_size[0])
+                )
+                aligned_index.append((idx, det_score))
+                confidences.append(det_score)
+            
+            if aligned_faces:
+                print(f"🧠 Running recognition on {len(aligned_faces)} faces (max batch {self.rec_max_batch_size})...")
+                features = self._embed_aligned_faces(aligned_faces).astype(np.float32)
+                for (idx, det_score), embedding in zip(aligned_index, features):
+                    embeddings[idx] = embedding
+                    if cache_keys[idx]:
+                        self.cache.put(cache_keys[idx], (embedding, det_score))
+            
+            embeddings = [embedding for embedding in embeddings if embedding is not None]
             
             if len(embeddings) == 0:
                 return {
@@ -209,6 +690,86 @@ class FaceEngine:
                 'error': str(e)
             }
     
+    def extract_group_embeddings(self, image_data, kiosk_id=None, max_faces=0):
+        """
+        Extract embeddings untuk semua face dalam satu frame (UNTUK GROUP CHECK-IN)
+        
+        Semua face di-detect, di-cek quality, di-align, lalu recognition
+        dijalankan sebagai satu batch.
+        
+        Args:
+            image_data: Base64 string, bytes, numpy array, atau PIL Image
+            kiosk_id: Optional kiosk id untuk preferred detection tier
+            max_faces: Max faces (0 = semua, face terbesar diprioritaskan)
+            
+        Returns:
+            dict: {
+                'success': True,
+                'face_count': int,
+                'faces': [
+                    {
+                        'bbox': [x1, y1, x2, y2],
+                        'confidence': float,
+                        'embedding': float32 array [512] atau None (rejected),
+                        'quality': dict atau None
+                    }
+                ]
+            }
+        """
+        if self.model is None:
+            return {'success': False, 'error': 'Face model not loaded'}
+        
+        if not self.has_recognition:
+            return {
+                'success': False,
+                'error': f"Recognition disabled by pipeline profile '{self.profile}'"
+            }
+        
+        try:
+            image_np, scale = self._decode(image_data)
+            bboxes, kpss, _ = self.cascade.detect(image_np, kiosk_id=kiosk_id, max_num=max_faces)
+            
+            rec_model = self.model.models['recognition']
+            faces = []
+            aligned_faces = []
+            aligned_index = []
+            
+            for i in range(bboxes.shape[0]):
+                kps = kpss[i] if kpss is not None else None
+                quality = assess_face_quality(image_np, bboxes[i, 0:4], kps) if self.quality_gate else None
+                
+                faces.append({
+                    'bbox': (bboxes[i, 0:4] * scale).tolist(),
+                    'confidence': float(bboxes[i, 4]),
+                    'embedding': None,
+                    'quality': quality
+                })
+                
+                if kps is None or (quality is not None and not quality['passed']):
+                    continue
+                
+                aligned_faces.append(
+                    face_align.norm_crop(image_np, landmark=kps, image_size=rec_model.input_size[0])
+                )
+                aligned_index.append(i)
+            
+            if aligned_faces:
+                print(f"🧠 Running recognition on {len(aligned_faces)}/{len(faces)} faces in one batch...")
+                embeddings = self._embed_aligned_faces(aligned_faces).astype(np.float32)
+                for i, embedding in zip(aligned_index, embeddings):
+                    faces[i]['embedding'] = embedding
+            
+            return {
+                'success': True,
+                'face_count': len(faces),
+                'faces': faces
+            }
+            
+        except Exception as e:
+            print(f"❌ Error extracting group embeddings: {e}")
+            traceback.print_exc()
+            return {'success': False, 'error': str(e)}
+    
     def calculate_similarity(self, embedding1, embedding2):
         """
         Calculate cosine similarity between two embeddings
@@ -302,7 +863,7 @@ class FaceEngine:
                     {
                         'bbox': [x1, y1, x2, y2],
                         'confidence': float,
-                        'embedding': [512]
+                        'embedding': float32 array [512]
                     }
                 ]
             }
@@ -311,10 +872,16 @@ class FaceEngine:
             return {'success': False, 'error': 'Face model not loaded'}
         
         try:
-            image_np = self.decode_image(image_data)
+            key, image_data = self._cache_key('faces', image_data)
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                print("⚡ Embedding cache hit")
+                return dict(cached, results=[dict(face) for face in cached['results']], cached=True)
             
-            # Process dengan InsightFace
-            faces = self.model.get(image_np)
+            image_np, scale = self._decode(image_data)
+            
+            # Process dengan InsightFace (detection cascade)
+            faces = self._get_faces(image_np)
             
             if len(faces) == 0:
                 return {'success': True, 'faces_detected': 0, 'results': []}
@@ -323,16 +890,27 @@ class FaceEngine:
             for face in faces:
                 if face.embedding is not None:
                     results.append({
-                        'bbox': face.bbox.tolist(),
+                        'bbox': (face.bbox * scale).tolist(),
+                        'confidence': float(face.det_score),
+                        'embedding': face.embedding.astype(np.float32)
+                    })
+                elif not self.has_recognition:
+                    # detect-only profile: tetap return bbox tanpa embedding
+                    results.append({
+                        'bbox': (face.bbox * scale).tolist(),
                         'confidence': float(face.det_score),
-                        'embedding': face.embedding.tolist()
+                        'embedding': None
                     })
             
-            return {
+            result = {
                 'success': True,
                 'faces_detected': len(faces),
                 'results': results
             }
+            if key is not None:
+                # Copy (termasuk per-face dict) supaya caller tidak mengubah cache entry
+                self.cache.put(key, dict(result, results=[dict(face) for face in results]))
+            return result
             
         except Exception as e:
             print(f"❌ Error processing image: {e}")
@@ -343,11 +921,35 @@ class FaceEngine:
         """Get information about loaded model"""
         return {
             'loaded': self.model is not None,
+            'state': self.state,
+            'error': self.error,
+            'load_time_ms': self.load_time_ms,
+            'warmup_ms': self.warmup_ms,
+            'det_sizes': [list(size) for size in self.det_sizes],
+            'decode_min_long_side': self.decode_min_long_side,
+            'detection_cascade': self.cascade.get_stats() if self.cascade else None,
             'model_name': 'buffalo_l',
+            'profile': self.profile,
+            'quantized': [taskname for taskname in self.quantize if self.model and taskname in self.model.models],
+            'modules': list(self.model.models.keys()) if self.model else [],
             'framework': 'InsightFace',
             'embedding_size': 512,
-            'provider': 'CPUExecutionProvider'
+            'provider': self.ort_config['providers'][0] if self.ort_config else None,
+            'onnxruntime': {
+                'provider_profile': self.ort_config['provider_profile'],
+                'providers': self.ort_config['providers'],
+                'sessions': {
+                    taskname: {
+                        'options': model_session_options(self.ort_config, taskname),
+                        'active_providers': model.session.get_providers()
+                    }
+                    for taskname, model in self.model.models.items()
+                }
+            } if self.ort_config and self.model else None,
+            'benchmark_ms': self.benchmark_ms,
+            'quality_gate': self.quality_gate,
+            'quality_rejections': dict(self.quality_rejections)
         }
 
-# Global instance
-face_engine = FaceEngine()
\ No newline at end of file
+# Global instance (model di-load di background, cek face_engine.is_ready)
+face_engine = FaceEngine(background=LOAD_IN_BACKGROUND)
\ No newline at end of file
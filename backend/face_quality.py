@@ -0,0 +1,125 @@
+import os
+import cv2
+import numpy as np
+
+
+# Quality gate on/off (dijalankan setelah detection, sebelum recognition)
+QUALITY_GATE_ENABLED = os.getenv('FACE_QUALITY_GATE', 'true').lower() == 'true'
+
+# Default thresholds (override lewat env)
+QUALITY_THRESHOLDS = {
+    # Variance of Laplacian pada face crop 112x112 (rendah = blur)
+    'min_blur_variance': float(os.getenv('FACE_QUALITY_MIN_BLUR_VARIANCE', '40')),
+    # Sisi terpanjang bbox dibanding sisi terpanjang frame
+    'min_face_ratio': float(os.getenv('FACE_QUALITY_MIN_FACE_RATIO', '0.08')),
+    # Offset hidung dari tengah mata, dibagi jarak antar mata (0 = frontal)
+    'max_yaw': float(os.getenv('FACE_QUALITY_MAX_YAW', '0.35')),
+    # Posisi hidung antara garis mata (0) dan garis mulut (1)
+    'min_pitch': float(os.getenv('FACE_QUALITY_MIN_PITCH', '0.25')),
+    'max_pitch': float(os.getenv('FACE_QUALITY_MAX_PITCH', '0.75')),
+    # Kemiringan garis mata (derajat)
+    'max_roll': float(os.getenv('FACE_QUALITY_MAX_ROLL', '25')),
+    # Mean gray level face crop (0-255)
+    'min_brightness': float(os.getenv('FACE_QUALITY_MIN_BRIGHTNESS', '50')),
+    'max_brightness': float(os.getenv('FACE_QUALITY_MAX_BRIGHTNESS', '210')),
+}
+
+# Pesan coaching untuk kiosk per rejection reason
+QUALITY_MESSAGES = {
+    'blurry': 'Hold still, the image is blurry',
+    'face_too_small': 'Move closer to the camera',
+    'face_turned': 'Look straight at the camera',
+    'head_pitched': 'Keep your head level',
+    'head_tilted': 'Keep your head upright',
+    'too_dark': 'Lighting is too dark',
+    'too_bright': 'Lighting is too bright',
+}
+
+BLUR_CROP_SIZE = 112
+
+
+def _face_crop(image_np, bbox):
+    height, width = image_np.shape[:2]
+    x1, y1, x2, y2 = [int(round(value)) for value in bbox]
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(width, x2), min(height, y2)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return cv2.cvtColor(image_np[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+
+
+def _pose(kps):
+    """Yaw/pitch/roll proxies dari 5 detector keypoints (mata kiri, mata kanan, hidung, mulut kiri, mulut kanan)"""
+    left_eye, right_eye, nose, left_mouth, right_mouth = np.asarray(kps, dtype=np.float32)[:5]
+    eye_mid = (left_eye + right_eye) / 2
+    mouth_mid = (left_mouth + right_mouth) / 2
+    eye_dx, eye_dy = right_eye - left_eye
+    interocular = float(np.hypot(eye_dx, eye_dy)) or 1.0
+    eye_to_mouth = float(mouth_mid[1] - eye_mid[1]) or 1.0
+
+    return {
+        'yaw': round(float(nose[0] - eye_mid[0]) / interocular, 3),
+        'pitch': round(float(nose[1] - eye_mid[1]) / eye_to_mouth, 3),
+        'roll': round(float(np.degrees(np.arctan2(eye_dy, eye_dx))), 1)
+    }
+
+
+def assess_face_quality(image_np, bbox, kps=None, thresholds=None):
+    """
+    Cek quality face sebelum recognition (blur, ukuran, pose, brightness)
+
+    Args:
+        image_np: BGR numpy array (frame yang sama dengan detection)
+        bbox: [x1, y1, x2, y2] di koordinat image_np
+        kps: Optional 5 detector keypoints [5, 2] (untuk pose)
+        thresholds: Optional override dari QUALITY_THRESHOLDS
+
+    Returns:
+        dict: {
+            'passed': bool,
+            'reasons': list of reason codes (lihat QUALITY_MESSAGES),
+            'messages': list of coaching messages,
+            'metrics': {'blur_variance', 'face_ratio', 'brightness', 'yaw', 'pitch', 'roll'}
+        }
+    """
+    limits = dict(QUALITY_THRESHOLDS)
+    limits.update(thresholds or {})
+    reasons = []
+
+    face_ratio = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) / max(image_np.shape[:2])
+    metrics = {'face_ratio': round(float(face_ratio), 4)}
+    if face_ratio < limits['min_face_ratio']:
+        reasons.append('face_too_small')
+
+    gray = _face_crop(image_np, bbox)
+    if gray is not None:
+        brightness = float(np.mean(gray))
+        normalized = cv2.resize(gray, (BLUR_CROP_SIZE, BLUR_CROP_SIZE))
+        blur_variance = float(cv2.Laplacian(normalized, cv2.CV_64F).var())
+        metrics['brightness'] = round(brightness, 1)
+        metrics['blur_variance'] = round(blur_variance, 1)
+
+        if blur_variance < limits['min_blur_variance']:
+            reasons.append('blurry')
+        if brightness < limits['min_brightness']:
+            reasons.append('too_dark')
+        elif brightness > limits['max_brightness']:
+            reasons.append('too_bright')
+
+    if kps is not None:
+        pose = _pose(kps)
+        metrics.update(pose)
+
+        if abs(pose['yaw']) > limits['max_yaw']:
+            reasons.append('face_turned')
+        if not limits['min_pitch'] <= pose['pitch'] <= limits['max_pitch']:
+            reasons.append('head_pitched')
+        if abs(pose['roll']) > limits['max_roll']:
+            reasons.append('head_tilted')
+
+    return {
+        'passed': not reasons,
+        'reasons': reasons,
+        'messages': [QUALITY_MESSAGES[reason] for reason in reasons],
+        'metrics': metrics
+    }
@@ -0,0 +1,193 @@
+import itertools
+import os
+import threading
+import time
+
+
+# Tracker global on/off; per request tetap opt-in lewat sessionId
+TRACKING_ENABLED = os.getenv('FACE_TRACKING', 'true').lower() == 'true'
+
+# Min IoU antara bbox frame sekarang dan frame sebelumnya untuk dianggap track yang sama
+TRACK_MIN_IOU = float(os.getenv('FACE_TRACK_MIN_IOU', '0.5'))
+
+# Gap (detik) antar frame lebih dari ini = track baru
+TRACK_MAX_GAP_SECONDS = float(os.getenv('FACE_TRACK_MAX_GAP_SECONDS', '1.0'))
+
+# Re-verify: embedding + identity dihitung ulang setiap N frame atau N detik
+TRACK_REVERIFY_FRAMES = int(os.getenv('FACE_TRACK_REVERIFY_FRAMES', '15'))
+TRACK_REVERIFY_SECONDS = float(os.getenv('FACE_TRACK_REVERIFY_SECONDS', '3.0'))
+
+# Re-embed jika detection score naik lebih dari ini (face lebih jelas dari frame yang di-embed)
+TRACK_QUALITY_GAIN = float(os.getenv('FACE_TRACK_QUALITY_GAIN', '0.05'))
+
+# Session yang tidak mengirim frame selama ini dihapus
+TRACK_SESSION_TTL_SECONDS = float(os.getenv('FACE_TRACK_SESSION_TTL_SECONDS', '60'))
+
+
+def bbox_iou(box_a, box_b):
+    """Intersection-over-union dua bbox [x1, y1, x2, y2]"""
+    x1 = max(box_a[0], box_b[0])
+    y1 = max(box_a[1], box_b[1])
+    x2 = min(box_a[2], box_b[2])
+    y2 = min(box_a[3], box_b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+
+    area_a = max(0.0, box_a[2] - box_a[0]) * max(0.0, box_a[3] - box_a[1])
+    area_b = max(0.0, box_b[2] - box_b[0]) * max(0.0, box_b[3] - box_b[1])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """State satu face yang sedang discan di satu session"""
+
+    def __init__(self, track_id, bbox, confidence, embedding, now):
+        self.track_id = track_id
+        self.bbox = list(bbox)
+        self.confidence = confidence
+        self.embedding = embedding
+        self.identity = None
+        self.frames = 1
+        self.frames_since_embed = 0
+        self.embedded_at = now
+        self.last_seen = now
+
+
+class FaceTracker:
+    """
+    Track primary face per kiosk session antar frame
+
+    Setiap frame tetap menjalankan detection. Jika bbox overlap dengan track
+    sebelumnya (IoU >= min_iou) dan track masih fresh, embedding dan
+    identity dari frame sebelumnya dipakai ulang sehingga recognition model
+    dan gallery search di-skip. Recognition dijalankan lagi untuk track baru,
+    saat detection score naik (quality lebih bagus), atau saat re-verify.
+    """
+
+    def __init__(self, min_iou=TRACK_MIN_IOU, max_gap_seconds=TRACK_MAX_GAP_SECONDS,
+                 reverify_frames=TRACK_REVERIFY_FRAMES, reverify_seconds=TRACK_REVERIFY_SECONDS,
+                 quality_gain=TRACK_QUALITY_GAIN, session_ttl_seconds=TRACK_SESSION_TTL_SECONDS):
+        self.min_iou = min_iou
+        self.max_gap_seconds = max_gap_seconds
+        self.reverify_frames = reverify_frames
+        self.reverify_seconds = reverify_seconds
+        self.quality_gain = quality_gain
+        self.session_ttl_seconds = session_ttl_seconds
+
+        self._lock = threading.Lock()
+        self._tracks = {}
+        self._track_ids = itertools.count(1)
+        self._frames = 0
+        self._reused = 0
+        self._new_tracks = 0
+        self._reverified = 0
+        self._identity_reused = 0
+
+    def lookup(self, session_id, bbox, confidence):
+        """
+        Cari track yang bisa dipakai ulang untuk detection frame ini
+
+        Args:
+            session_id: Kiosk/session key
+            bbox: [x1, y1, x2, y2] di koordinat image asli
+            confidence: Detection score
+
+        Returns:
+            FaceTrack jika embedding boleh dipakai ulang, None jika harus re-embed
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._frames += 1
+            track = self._tracks.get(session_id)
+            if track is None:
+                return None
+
+            if (now - track.last_seen > self.max_gap_seconds
+                    or bbox_iou(track.bbox, bbox) < self.min_iou):
+                return None
+
+            if (track.frames_since_embed + 1 >= self.reverify_frames
+                    or now - track.embedded_at >= self.reverify_seconds
+                    or confidence > track.confidence + self.quality_gain):
+                return None
+
+            track.bbox = list(bbox)
+            track.frames += 1
+            track.frames_since_embed += 1
+            track.last_seen = now
+            self._reused += 1
+            return track
+
+    def update(self, session_id, bbox, confidence, embedding):
+        """
+        Simpan embedding baru untuk session (setelah recognition dijalankan)
+
+        Jika bbox masih overlap dengan track lama, track_id dan frame count
+        dipertahankan tapi identity di-reset supaya gallery search diulang.
+
+        Returns:
+            FaceTrack
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            track = self._tracks.get(session_id)
+
+            if (track is not None
+                    and now - track.last_seen <= self.max_gap_seconds
+                    and bbox_iou(track.bbox, bbox) >= self.min_iou):
+                track.bbox = list(bbox)
+                track.confidence = confidence
+                track.embedding = embedding
+                track.identity = None
+                track.frames += 1
+                track.frames_since_embed = 0
+                track.embedded_at = now
+                track.last_seen = now
+                self._reverified += 1
+                return track
+
+            track = FaceTrack(next(self._track_ids), bbox, confidence, embedding, now)
+            self._tracks[session_id] = track
+            self._new_tracks += 1
+            return track
+
+    def _prune(self, now):
+        expired = [
+            session_id for session_id, track in self._tracks.items()
+            if now - track.last_seen > self.session_ttl_seconds
+        ]
+        for session_id in expired:
+            del self._tracks[session_id]
+
+    def get_identity(self, session_id, track_id):
+        """Identity (hasil recognize_face) dari track, None jika belum ada atau track sudah berganti"""
+        with self._lock:
+            track = self._tracks.get(session_id)
+            if track is None or track.track_id != track_id or track.identity is None:
+                return None
+            self._identity_reused += 1
+            return track.identity
+
+    def set_identity(self, session_id, track_id, identity):
+        """Simpan hasil recognize_face untuk track (di-skip jika track sudah berganti)"""
+        with self._lock:
+            track = self._tracks.get(session_id)
+            if track is not None and track.track_id == track_id:
+                track.identity = identity
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'active_sessions': len(self._tracks),
+                'frames': self._frames,
+                'embeddings_reused': self._reused,
+                'new_tracks': self._new_tracks,
+                'reverified': self._reverified,
+                'identities_reused': self._identity_reused,
+                'reuse_rate': round(self._reused / self._frames, 4) if self._frames else 0.0
+            }
+
+
+# Global tracker, dipakai bersama oleh semua pool engines
+face_tracker = FaceTracker() if TRACKING_ENABLED else None
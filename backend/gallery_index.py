@@ -0,0 +1,372 @@
+import threading
+import numpy as np
+
+from search_backends import create_search_backend, ExactSearch
+
+
+EMPLOYEE_FIELDS = ('employee_id', 'name', 'department', 'position', 'email', 'phone')
+
+
+def normalize_rows(matrix):
+    """L2-normalize setiap row (zero-norm row tetap nol, similarity-nya jadi 0)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def templates_from_document(employee):
+    """
+    Ambil list template dari employee document
+
+    Handle format lama (single embedding sebagai flat list) dan
+    format baru (array of embeddings).
+    """
+    embeddings = employee.get('face_embeddings')
+    if not embeddings:
+        return []
+    if not isinstance(embeddings[0], (list, tuple, np.ndarray)):
+        embeddings = [embeddings]
+    return embeddings
+
+
+class GalleryBlock:
+    """
+    Semua template dengan dimensi yang sama (512D InsightFace / 128D legacy)
+
+    Row milik satu employee selalu contiguous, jadi grouped max bisa
+    dihitung dengan satu np.maximum.reduceat.
+    """
+
+    def __init__(self, matrix, owners, assignments=None):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.owners = np.asarray(owners, dtype=np.int32)
+        # Cluster id per row untuk approximate backend (-1 = belum di-assign)
+        if assignments is None:
+            assignments = np.full(len(self.owners), -1, dtype=np.int32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.inverted_lists = None
+        if len(self.owners) > 0:
+            change = np.flatnonzero(self.owners[1:] != self.owners[:-1]) + 1
+            self.starts = np.concatenate(([0], change)).astype(np.intp)
+        else:
+            self.starts = np.zeros(0, dtype=np.intp)
+        self.group_owner = self.owners[self.starts]
+
+    def without_owner(self, owner):
+        keep = self.owners != owner
+        return GalleryBlock(self.matrix[keep], self.owners[keep], self.assignments[keep])
+
+    def append(self, matrix, owner):
+        return GalleryBlock(
+            np.concatenate([self.matrix, matrix]),
+            np.concatenate([self.owners, np.full(len(matrix), owner, dtype=np.int32)]),
+            np.concatenate([self.assignments, np.full(len(matrix), -1, dtype=np.int32)])
+        )
+
+
+class GallerySnapshot:
+    """Immutable view dari gallery. Reader cukup pegang reference ke snapshot."""
+
+    def __init__(self, employees=(), index_of=None, blocks=None, indexes=None):
+        self.employees = tuple(employees)
+        self.index_of = index_of or {}
+        self.blocks = blocks or {}
+        self.indexes = indexes or {}  # per dimensi, state search backend (None = exact)
+
+    @property
+    def employee_count(self):
+        return len(self.index_of)
+
+    @property
+    def template_count(self):
+        return sum(len(block.owners) for block in self.blocks.values())
+
+
+class GalleryIndex:
+    """
+    Resident in-memory index untuk face recognition
+
+    Semua template disimpan sebagai satu matrix float32 yang sudah
+    di-normalize per dimensi, plus mapping row -> employee. Recognition
+    jadi satu matrix-vector product + grouped max.
+
+    Writer (load / upsert) membangun snapshot baru lalu swap reference,
+    jadi recognition yang sedang jalan tidak pernah di-block.
+
+    Search dijalankan oleh pluggable backend (lihat search_backends):
+    exact brute force (default) atau approximate IVF index.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or create_search_backend()
+        self._exact = self.backend if isinstance(self.backend, ExactSearch) else ExactSearch()
+        self._snapshot = GallerySnapshot()
+        self._write_lock = threading.Lock()
+        self.loaded = False
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @staticmethod
+    def _employee_meta(employee):
+        return {field: employee[field] for field in EMPLOYEE_FIELDS if field in employee}
+
+    @staticmethod
+    def _group_templates(employee):
+        """
+        Group template employee per dimensi -> {dim: normalized matrix}
+
+        Template datang dari 'templates' (list of unpacked float32 matrices
+        dari collection face_templates) dan/atau 'face_embeddings' (format
+        lama yang belum di-migrate).
+        """
+        grouped = {}
+        for matrix in employee.get('templates') or ():
+            grouped.setdefault(matrix.shape[1], []).append(matrix)
+        for template in templates_from_document(employee):
+            grouped.setdefault(len(template), []).append(np.asarray(template, dtype=np.float32)[None, :])
+        return {
+            dim: normalize_rows(np.concatenate(matrices))
+            for dim, matrices in grouped.items()
+        }
+
+    def load(self, employees):
+        """
+        Build snapshot penuh dari iterable employee documents
+
+        Args:
+            employees: Iterable of employee documents (dengan templates / face_embeddings)
+        """
+        with self._write_lock:
+            self._build(employees)
+
+    def _build(self, employees):
+        metas = []
+        index_of = {}
+        rows = {}
+        owners = {}
+
+        for employee in employees:
+            employee_id = employee.get('employee_id')
+            if employee_id is None or employee_id in index_of:
+                continue
+            idx = len(metas)
+            metas.append(self._employee_meta(employee))
+            index_of[employee_id] = idx
+            for dim, matrix in self._group_templates(employee).items():
+                rows.setdefault(dim, []).append(matrix)
+                owners.setdefault(dim, []).append(np.full(len(matrix), idx, dtype=np.int32))
+
+        blocks = {
+            dim: GalleryBlock(np.concatenate(rows[dim]), np.concatenate(owners[dim]))
+            for dim in rows
+        }
+        indexes = {
+            dim: self.backend.index_block(block, self._snapshot.indexes.get(dim))
+            for dim, block in blocks.items()
+        }
+        self._snapshot = GallerySnapshot(metas, index_of, blocks, indexes)
+        self.loaded = True
+
+        print(f"✅ Gallery index loaded: {self._snapshot.employee_count} employees, "
+              f"{self._snapshot.template_count} templates")
+
+    def restore(self, employees, matrices, owners):
+        """
+        Install snapshot dari array yang sudah jadi (mis. on-disk memmap snapshot)
+
+        Matrix float32 yang contiguous dipakai apa adanya (tanpa copy), jadi
+        pages memmap di-share oleh semua worker yang me-map file yang sama.
+
+        Args:
+            employees: List of employee meta (urutan = owner index)
+            matrices: {dim: normalized float32 matrix [rows, dim]}
+            owners: {dim: int32 owner index per row}
+        """
+        with self._write_lock:
+            metas = list(employees)
+            index_of = {employee['employee_id']: idx for idx, employee in enumerate(metas) if employee}
+            blocks = {dim: GalleryBlock(matrices[dim], owners[dim]) for dim in matrices}
+            indexes = {
+                dim: self.backend.index_block(block, self._snapshot.indexes.get(dim))
+                for dim, block in blocks.items()
+            }
+            self._snapshot = GallerySnapshot(metas, index_of, blocks, indexes)
+            self.loaded = True
+
+        print(f"✅ Gallery index restored: {self._snapshot.employee_count} employees, "
+              f"{self._snapshot.template_count} templates")
+
+    def ensure_loaded(self, loader):
+        """
+        Load gallery sekali (lazy) memakai loader()
+
+        Args:
+            loader: Callable yang return iterable of employee documents
+        """
+        if self.loaded:
+            return
+        with self._write_lock:
+            if not self.loaded:
+                self._build(loader())
+
+    def upsert(self, employee):
+        """
+        Tambah / replace template satu employee tanpa full reload
+
+        Jika gallery belum pernah di-load, upsert di-skip karena load
+        berikutnya akan membaca employee ini dari database.
+        """
+        with self._write_lock:
+            if not self.loaded:
+                return
+
+            snapshot = self._snapshot
+            employee_id = employee.get('employee_id')
+            employees = list(snapshot.employees)
+            index_of = dict(snapshot.index_of)
+            blocks = dict(snapshot.blocks)
+
+            idx = index_of.get(employee_id)
+            if idx is None:
+                idx = len(employees)
+                employees.append(self._employee_meta(employee))
+                index_of[employee_id] = idx
+            else:
+                employees[idx] = self._employee_meta(employee)
+                blocks = {dim: block.without_owner(idx) for dim, block in blocks.items()}
+
+            for dim, matrix in self._group_templates(employee).items():
+                block = blocks.get(dim)
+                if block is None:
+                    blocks[dim] = GalleryBlock(matrix, np.full(len(matrix), idx, dtype=np.int32))
+                else:
+                    blocks[dim] = block.append(matrix, idx)
+
+            # Template baru di-assign ke index yang sudah ada (tanpa rebuild)
+            indexes = {
+                dim: self.backend.index_block(block, snapshot.indexes.get(dim))
+                for dim, block in blocks.items()
+            }
+            self._snapshot = GallerySnapshot(employees, index_of, blocks, indexes)
+
+    def remove(self, employee_id):
+        """
+        Hapus employee (dan semua template-nya) dari gallery
+
+        Slot employee diganti None supaya owner index employee lain tidak berubah.
+
+        Returns:
+            bool: True jika employee ada di gallery
+        """
+        with self._write_lock:
+            snapshot = self._snapshot
+            idx = snapshot.index_of.get(employee_id)
+            if idx is None:
+                return False
+
+            employees = list(snapshot.employees)
+            employees[idx] = None
+            index_of = dict(snapshot.index_of)
+            del index_of[employee_id]
+            blocks = {dim: block.without_owner(idx) for dim, block in snapshot.blocks.items()}
+            indexes = {
+                dim: self.backend.index_block(block, snapshot.indexes.get(dim))
+                for dim, block in blocks.items()
+            }
+            self._snapshot = GallerySnapshot(employees, index_of, blocks, indexes)
+            return True
+
+    def search(self, face_embedding):
+        """
+        Cari employee dengan similarity tertinggi
+
+        Args:
+            face_embedding: List or numpy array [N]
+
+        Returns:
+            tuple: (employee dict atau None, similarity float 0-1)
+        """
+        candidates = self.search_top_k(face_embedding, 1)
+        return candidates[0] if candidates else (None, 0.0)
+
+    @property
+    def approximate(self):
+        """True jika backend hanya me-re-rank sebagian employee (IVF / centroid)"""
+        return self._exact is not self.backend
+
+    def search_top_k(self, face_embedding, k, exact=False):
+        """
+        Top-k employee dari satu gallery pass (grouped max yang sama dengan search)
+
+        Approximate backend hanya menilai employee di shortlist, jadi kandidat
+        #2 ke bawah bisa bukan runner-up sebenarnya. exact=True memaksa
+        brute force pass (mis. untuk margin yang dipakai ambiguity rule).
+
+        Args:
+            face_embedding: List or numpy array [N]
+            k: Jumlah kandidat
+            exact: Abaikan approximate backend
+
+        Returns:
+            list of tuple: (employee dict, similarity float 0-1), terbaik dulu
+        """
+        snapshot = self._snapshot
+        probe = np.asarray(face_embedding, dtype=np.float32).ravel()
+        block = snapshot.blocks.get(probe.shape[0])
+
+        if block is None or len(block.owners) == 0:
+            print(f"⚠️ No templates with {probe.shape[0]} dimensions in gallery")
+            return []
+
+        norm = np.linalg.norm(probe)
+        if norm == 0:
+            print("⚠️ Zero norm detected in embedding")
+            return []
+
+        backend = self._exact if exact else self.backend
+        matches = backend.search_top_k(block, snapshot.indexes.get(probe.shape[0]), probe / norm, k)
+
+        # Clip to 0-1 range (cosine can be -1 to 1, but for faces should be 0-1)
+        return [
+            (snapshot.employees[block.group_owner[group]], float(np.clip(similarity, 0.0, 1.0)))
+            for group, similarity in matches
+        ]
+
+    def search_many(self, face_embeddings):
+        """
+        Cari employee terbaik untuk beberapa face sekaligus
+
+        Dengan exact backend: satu matrix-matrix product [templates, D] x
+        [D, faces] lalu grouped max per employee, bukan satu search() per face.
+
+        Args:
+            face_embeddings: List of embeddings [N] (dimensi sama)
+
+        Returns:
+            list of tuple: (employee dict atau None, similarity float 0-1) per face
+        """
+        if len(face_embeddings) == 0:
+            return []
+
+        snapshot = self._snapshot
+        # np.array (copy): probes di-normalize in place, embeddings caller tidak boleh berubah
+        probes = np.array(face_embeddings, dtype=np.float32).reshape(len(face_embeddings), -1)
+        block = snapshot.blocks.get(probes.shape[1])
+
+        if block is None or len(block.owners) == 0:
+            print(f"⚠️ No templates with {probes.shape[1]} dimensions in gallery")
+            return [(None, 0.0)] * len(probes)
+
+        norms = np.linalg.norm(probes, axis=1)
+        valid = norms > 0
+        probes[valid] /= norms[valid, None]
+
+        matches = self.backend.search_many(block, snapshot.indexes.get(probes.shape[1]), probes)
+
+        return [
+            (snapshot.employees[block.group_owner[group]], float(np.clip(similarity, 0.0, 1.0))) if is_valid
+            else (None, 0.0)
+            for (group, similarity), is_valid in zip(matches, valid)
+        ]
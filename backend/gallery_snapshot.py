@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+# Directory untuk on-disk gallery snapshot ('' = disabled)
+SNAPSHOT_DIR = os.getenv('FACE_GALLERY_SNAPSHOT_DIR', '')
+
+# Jumlah snapshot lama yang disimpan (worker lain mungkin masih me-map-nya)
+SNAPSHOT_KEEP = int(os.getenv('FACE_GALLERY_SNAPSHOT_KEEP', '2'))
+
+SNAPSHOT_FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+
+
+def _matrix_file(dim):
+    return f'matrix_{dim}.f32'
+
+
+def _owners_file(dim):
+    return f'owners_{dim}.i32'
+
+
+def save_gallery_snapshot(snapshot, high_water_mark, directory=SNAPSHOT_DIR):
+    """
+    Tulis gallery snapshot ke disk
+
+    Layout:
+        <directory>/CURRENT                   -> nama snapshot aktif
+        <directory>/gallery-<ts>/meta.json    -> version, high-water mark, employee table
+        <directory>/gallery-<ts>/matrix_<dim>.f32, owners_<dim>.i32
+
+    Snapshot ditulis ke directory baru lalu CURRENT di-swap atomically,
+    jadi worker yang sedang me-map snapshot lama tidak terganggu.
+
+    Args:
+        snapshot: GallerySnapshot
+        high_water_mark: datetime 'last_updated' terbaru yang sudah masuk snapshot
+        directory: Snapshot root directory
+
+    Returns:
+        str: Path snapshot yang ditulis
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f'gallery-{time.time_ns()}'
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    dims = {}
+    for dim, block in snapshot.blocks.items():
+        np.ascontiguousarray(block.matrix, dtype=np.float32).tofile(os.path.join(path, _matrix_file(dim)))
+        np.ascontiguousarray(block.owners, dtype=np.int32).tofile(os.path.join(path, _owners_file(dim)))
+        dims[str(dim)] = int(len(block.owners))
+
+    meta = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'high_water_mark': high_water_mark.isoformat() if high_water_mark else None,
+        'employees': list(snapshot.employees),
+        'dims': dims
+    }
+    with open(os.path.join(path, META_FILE), 'w') as meta_file:
+        json.dump(meta, meta_file, default=str)
+
+    current_tmp = os.path.join(directory, CURRENT_FILE + '.tmp')
+    with open(current_tmp, 'w') as current_file:
+        current_file.write(name)
+    os.replace(current_tmp, os.path.join(directory, CURRENT_FILE))
+
+    _prune_snapshots(directory, keep=name)
+    print(f"💾 Gallery snapshot saved: {path} ({snapshot.employee_count} employees, "
+          f"{snapshot.template_count} templates)")
+    return path
+
+
+def _prune_snapshots(directory, keep):
+    snapshots = sorted(
+        entry for entry in os.listdir(directory)
+        if entry.startswith('gallery-') and entry != keep
+    )
+    for entry in snapshots[:max(0, len(snapshots) - SNAPSHOT_KEEP + 1)]:
+        shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def load_gallery_snapshot(directory=SNAPSHOT_DIR):
+    """
+    Map snapshot aktif dari disk (read-only, pages di-share antar worker)
+
+    Returns:
+        dict: {
+            'employees': list of employee meta,
+            'matrices': {dim: np.memmap float32 [rows, dim]},
+            'owners': {dim: np.memmap int32 [rows]},
+            'high_water_mark': datetime atau None,
+            'path': str
+        }
+        atau None jika tidak ada snapshot yang valid
+    """
+    current = os.path.join(directory, CURRENT_FILE)
+    if not directory or not os.path.exists(current):
+        return None
+
+    with open(current) as current_file:
+        path = os.path.join(directory, current_file.read().strip())
+
+    try:
+        with open(os.path.join(path, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Gallery snapshot unreadable ({path}): {e}")
+        return None
+
+    if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        print(f"⚠️ Gallery snapshot format {meta.get('format_version')} not supported, ignoring")
+        return None
+
+    matrices = {}
+    owners = {}
+    for dim, rows in meta['dims'].items():
+        dim, rows = int(dim), int(rows)
+        if rows == 0:
+            continue
+        matrices[dim] = np.memmap(os.path.join(path, _matrix_file(dim)), dtype=np.float32, mode='r', shape=(rows, dim))
+        owners[dim] = np.memmap(os.path.join(path, _owners_file(dim)), dtype=np.int32, mode='r', shape=(rows,))
+
+    high_water_mark = meta.get('high_water_mark')
+    return {
+        'employees': meta['employees'],
+        'matrices': matrices,
+        'owners': owners,
+        'high_water_mark': datetime.fromisoformat(high_water_mark) if high_water_mark else None,
+        'path': path
+    }
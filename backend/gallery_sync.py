@@ -0,0 +1,242 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+# Gallery sync on/off (butuh MongoDB replica set, single-node juga cukup)
+GALLERY_SYNC_ENABLED = os.getenv('FACE_GALLERY_SYNC', 'false').lower() == 'true'
+
+# Identitas node untuk resume token (worker di host yang sama share token;
+# replay event aman karena setiap event di-apply ulang dari state database)
+GALLERY_SYNC_ID = os.getenv('FACE_GALLERY_SYNC_ID', '') or socket.gethostname()
+
+# Collection tempat resume token disimpan
+GALLERY_SYNC_STATE_COLLECTION = os.getenv('FACE_GALLERY_SYNC_STATE_COLLECTION', 'gallery_sync_state')
+
+# Max tunggu per poll change stream (ms) dan interval simpan token saat idle (detik)
+GALLERY_SYNC_AWAIT_MS = int(os.getenv('FACE_GALLERY_SYNC_AWAIT_MS', '1000'))
+GALLERY_SYNC_TOKEN_SAVE_SECONDS = float(os.getenv('FACE_GALLERY_SYNC_TOKEN_SAVE_SECONDS', '30'))
+
+# Backoff setelah error (detik)
+GALLERY_SYNC_RETRY_SECONDS = float(os.getenv('FACE_GALLERY_SYNC_RETRY_SECONDS', '5'))
+
+# Collection yang mempengaruhi gallery
+WATCHED_COLLECTIONS = ('employees', 'face_templates')
+
+# Resume token tidak bisa dipakai lagi (oplog sudah lewat / token rusak)
+INVALID_TOKEN_CODES = (260, 280, 286)  # InvalidResumeToken, ChangeStreamFatalError, ChangeStreamHistoryLost
+
+# $changeStream hanya jalan di replica set / sharded cluster
+NOT_REPLICA_SET_CODES = (40573,)
+
+
+class GallerySync:
+    """
+    Sinkronkan in-memory gallery dengan perubahan dari node lain via change stream
+
+    Satu change stream di level database, di-filter ke collection employees
+    dan face_templates (attendance write tidak pernah sampai ke sini):
+        insert / update / replace -> refresh employee itu saja
+        delete employee           -> reconcile employee_id yang hilang
+    Resume token disimpan di GALLERY_SYNC_STATE_COLLECTION; full reload
+    hanya dilakukan jika token sudah tidak valid.
+
+    Test lokal dengan single-node replica set:
+        mongod --replSet rs0 --dbpath ./data
+        mongosh --eval "rs.initiate()"
+        MONGODB_URI=mongodb://localhost:27017/?replicaSet=rs0 python gallery_sync.py
+    """
+
+    def __init__(self, manager, sync_id=GALLERY_SYNC_ID):
+        self.manager = manager
+        self.sync_id = sync_id
+        self.state = manager.db[GALLERY_SYNC_STATE_COLLECTION]
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._token = None
+        self._token_saved_at = 0.0
+        self._token_dirty = False
+
+        self.running = False
+        self.error = None
+        self.events = 0
+        self.upserts = 0
+        self.removals = 0
+        self.full_reloads = 0
+        self.last_event_at = None
+
+    # ------ RESUME TOKEN
+    def _load_token(self):
+        state = self.state.find_one({'_id': self.sync_id})
+        return state.get('resume_token') if state else None
+
+    def _save_token(self, force=False):
+        if self._token is None or not self._token_dirty:
+            return
+        if not force and time.monotonic() - self._token_saved_at < GALLERY_SYNC_TOKEN_SAVE_SECONDS:
+            return
+        try:
+            self.state.update_one(
+                {'_id': self.sync_id},
+                {'$set': {'resume_token': self._token, 'updated_at': datetime.now()}},
+                upsert=True
+            )
+            self._token_saved_at = time.monotonic()
+            self._token_dirty = False
+        except PyMongoError as e:
+            print(f"⚠️ Gallery sync: error saving resume token: {e}")
+
+    def _clear_token(self):
+        self._token = None
+        self._token_dirty = False
+        self.state.delete_one({'_id': self.sync_id})
+
+    # ------ CHANGE STREAM
+    def _watch(self, resume_token):
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': list(WATCHED_COLLECTIONS)},
+            'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}
+        }}]
+        return self.manager.db.watch(
+            pipeline,
+            full_document='updateLookup',
+            resume_after=resume_token,
+            max_await_time_ms=GALLERY_SYNC_AWAIT_MS
+        )
+
+    def _open_stream(self):
+        """
+        Buka change stream dari stored token, fallback full reload jika token invalid
+        """
+        resume_token = self._token or self._load_token()
+        if resume_token is not None:
+            try:
+                stream = self._watch(resume_token)
+                print(f"🔄 Gallery sync resumed ({self.sync_id})")
+            except OperationFailure as e:
+                if e.code not in INVALID_TOKEN_CODES:
+                    raise
+                print(f"⚠️ Gallery sync: resume token invalid ({e.code}), full reload")
+                self._clear_token()
+                stream = self._watch(None)
+                self.manager.reload_gallery()
+                self.full_reloads += 1
+                return stream
+        else:
+            stream = self._watch(None)
+            print(f"🔄 Gallery sync started ({self.sync_id})")
+
+        # Stream dibuka sebelum gallery di-load, jadi tidak ada perubahan yang terlewat
+        self.manager.ensure_gallery()
+        return stream
+
+    def apply_change(self, change):
+        """
+        Apply satu change event ke gallery
+
+        Setiap event di-resolve ke state database saat ini, jadi replay
+        (resume dari token lama, atau event dari write node ini sendiri) idempotent.
+        """
+        self.events += 1
+        self.last_event_at = datetime.now().isoformat()
+
+        if change['operationType'] == 'delete':
+            # Delete hanya membawa _id; template yang dihapus saat re-register
+            # selalu diikuti insert, jadi cukup reconcile untuk employees
+            if change['ns']['coll'] == 'employees':
+                self.removals += self.manager.reconcile_gallery_deletes()
+            return
+
+        document = change.get('fullDocument') or {}
+        employee_id = document.get('employee_id')
+        if employee_id is None:
+            return
+
+        outcome = self.manager.refresh_gallery_employee(employee_id)
+        if outcome == 'upserted':
+            self.upserts += 1
+        elif outcome == 'removed':
+            self.removals += 1
+
+    def _run(self):
+        self.running = True
+        while not self._stop.is_set():
+            try:
+                with self._open_stream() as stream:
+                    self.error = None
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            self.apply_change(change)
+                        if stream.resume_token is not None and stream.resume_token != self._token:
+                            self._token = stream.resume_token
+                            self._token_dirty = True
+                        self._save_token(force=change is not None)
+            except OperationFailure as e:
+                if e.code in NOT_REPLICA_SET_CODES:
+                    print("❌ Gallery sync needs a MongoDB replica set, sync disabled")
+                    self.error = str(e)
+                    break
+                print(f"❌ Gallery sync error: {e}")
+                self.error = str(e)
+            except Exception as e:
+                print(f"❌ Gallery sync error: {e}")
+                traceback.print_exc()
+                self.error = str(e)
+            self._stop.wait(GALLERY_SYNC_RETRY_SECONDS)
+
+        self._save_token(force=True)
+        self.running = False
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='gallery-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        return {
+            'sync_id': self.sync_id,
+            'running': self.running,
+            'error': self.error,
+            'events': self.events,
+            'upserts': self.upserts,
+            'removals': self.removals,
+            'full_reloads': self.full_reloads,
+            'last_event_at': self.last_event_at,
+            'gallery_employees': self.manager.gallery.snapshot.employee_count
+        }
+
+
+def main():
+    """
+    Jalankan gallery sync di foreground (mis. terhadap local single-node replica set)
+
+    Usage:
+        python gallery_sync.py
+    """
+    from mongo_db import db
+    sync = GallerySync(db)
+    sync.start()
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📊 Gallery sync: {sync.get_stats()}")
+    except KeyboardInterrupt:
+        sync.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from face_engine import FaceEngine, face_engine
+from detection_cascade import merge_cascade_stats
+from recognition_batcher import RecognitionBatcher, BATCH_WINDOW_MS
+from face_tracker import face_tracker
+from embedding_cache import embedding_cache
+
+
+# Jumlah FaceEngine instance (masing-masing punya ONNX sessions sendiri)
+POOL_SIZE = int(os.getenv('FACE_POOL_SIZE', '1'))
+
+# Max request yang boleh antre menunggu engine; lebih dari ini langsung ditolak
+POOL_MAX_QUEUE = int(os.getenv('FACE_POOL_MAX_QUEUE', '8'))
+
+# Max waktu (detik) menunggu engine sebelum request dibatalkan
+POOL_QUEUE_TIMEOUT = float(os.getenv('FACE_POOL_QUEUE_TIMEOUT', '2.0'))
+
+WAIT_HISTORY = 500
+
+
+class PoolSaturated(Exception):
+    """Queue penuh atau wait timeout: caller harus retry nanti (429/503)"""
+
+    def __init__(self, message, status_code, retry_after=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """
+    Bounded pool of FaceEngine instances dengan backpressure
+
+    Request thread meminjam satu engine idle, menjalankan inference, lalu
+    mengembalikannya. Maksimal size + max_queue request boleh berada di
+    dalam pool; sisanya langsung ditolak (429) daripada menumpuk latency,
+    dan request yang menunggu lebih dari queue_timeout dapat 503.
+    """
+
+    def __init__(self, engines, max_queue=POOL_MAX_QUEUE, queue_timeout=POOL_QUEUE_TIMEOUT):
+        self.engines = list(engines)
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = queue_timeout
+
+        self._idle = queue.Queue()
+        self._admission = threading.BoundedSemaphore(len(self.engines) + self.max_queue)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._completed = 0
+        self._wait_ms = deque(maxlen=WAIT_HISTORY)
+
+        # Engine baru masuk idle queue setelah selesai warm-up
+        for engine in self.engines:
+            threading.Thread(target=self._admit_when_ready, args=(engine,), daemon=True).start()
+
+    def _admit_when_ready(self, engine):
+        if engine.wait_until_ready():
+            self._idle.put(engine)
+
+    @property
+    def is_ready(self):
+        return any(engine.is_ready for engine in self.engines)
+
+    def run(self, method, *args, **kwargs):
+        """
+        Jalankan FaceEngine method di engine yang idle
+
+        Raises:
+            PoolSaturated: queue penuh (429) atau wait timeout (503)
+        """
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PoolSaturated('Face inference queue is full', 429)
+
+        try:
+            submitted = time.perf_counter()
+            with self._lock:
+                self._waiting += 1
+            try:
+                engine = self._idle.get(timeout=self.queue_timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._timeouts += 1
+                raise PoolSaturated('Timed out waiting for a face engine', 503)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+            with self._lock:
+                self._in_flight += 1
+                self._wait_ms.append((time.perf_counter() - submitted) * 1000)
+
+            try:
+                return getattr(engine, method)(*args, **kwargs)
+            finally:
+                self._idle.put(engine)
+                with self._lock:
+                    self._in_flight -= 1
+                    self._completed += 1
+        finally:
+            self._admission.release()
+
+    def get_stats(self):
+        """Queue depth, in-flight, wait time dan rejection counters"""
+        with self._lock:
+            wait_ms = list(self._wait_ms)
+            return {
+                'size': len(self.engines),
+                'ready_engines': sum(1 for engine in self.engines if engine.is_ready),
+                'max_queue': self.max_queue,
+                'queue_depth': self._waiting,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'wait_ms': {
+                    'p50': round(float(np.percentile(wait_ms, 50)), 2) if wait_ms else 0.0,
+                    'p95': round(float(np.percentile(wait_ms, 95)), 2) if wait_ms else 0.0,
+                    'max': round(max(wait_ms), 2) if wait_ms else 0.0
+                }
+            }
+
+    def get_detection_stats(self):
+        """Detection cascade dan quality gate counters, dijumlah dari semua engine"""
+        quality_rejections = {}
+        for engine in self.engines:
+            for reason, count in dict(engine.quality_rejections).items():
+                quality_rejections[reason] = quality_rejections.get(reason, 0) + count
+        return {
+            'detection_cascade': merge_cascade_stats(
+                [engine.cascade.get_stats() for engine in self.engines if engine.cascade]
+            ),
+            'quality_rejections': quality_rejections
+        }
+
+
+# Global pool: engine global + (POOL_SIZE - 1) engine tambahan
+inference_pool = InferencePool(
+    [face_engine] + [FaceEngine(background=True) for _ in range(POOL_SIZE - 1)]
+)
+
+# Single-face recognition dari semua engine lewat satu shared micro-batcher
+# (dengan satu engine tidak ada request bersamaan yang bisa digabung)
+recognition_batcher = None
+if BATCH_WINDOW_MS > 0 and POOL_SIZE > 1:
+    recognition_batcher = RecognitionBatcher(inference_pool.engines)
+    for engine in inference_pool.engines:
+        engine.batcher = recognition_batcher
+
+# Track state per session dan embedding cache harus sama untuk engine manapun yang menerima request
+for engine in inference_pool.engines:
+    engine.tracker = face_tracker
+    engine.cache = embedding_cache
@@ -0,0 +1,29 @@
+import argparse
+
+from embedding_codec import TEMPLATE_DTYPE
+
+
+def main():
+    """
+    Migrate employees.face_embeddings ke collection face_templates (packed binary)
+
+    Usage:
+        python migrate_face_templates.py [--dtype float16] [--dry-run] [--keep-legacy]
+    """
+    parser = argparse.ArgumentParser(description='Move face embeddings out of employee documents into packed face_templates')
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default=TEMPLATE_DTYPE,
+                        help='Storage dtype for the packed templates')
+    parser.add_argument('--dry-run', action='store_true', help='Count documents to migrate without writing')
+    parser.add_argument('--keep-legacy', action='store_true',
+                        help='Keep face_embeddings in employee documents after migrating')
+    args = parser.parse_args()
+
+    from mongo_db import MongoDBManager
+    db = MongoDBManager()
+    result = db.migrate_face_templates(dtype=args.dtype, dry_run=args.dry_run, keep_legacy=args.keep_legacy)
+    if not result['success']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,44 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from datetime import datetime, time, timedelta
 import os
 from dotenv import load_dotenv
 import traceback
 import numpy as np
 from bson import ObjectId
+import threading
+import time as time_module
 import traceback
 
 from notification_service import send_all_notifications
+from gallery_index import GalleryIndex, templates_from_document
+from embedding_codec import TEMPLATE_DTYPE, pack_templates, unpack_templates
+from gallery_snapshot import SNAPSHOT_DIR, save_gallery_snapshot, load_gallery_snapshot
 
 
 load_dotenv()
 
+# Jumlah kandidat yang dikembalikan recognize_face (untuk review / retry di kiosk)
+RECOGNITION_TOP_K = int(os.getenv('FACE_RECOGNITION_TOP_K', '3'))
+
+# Selisih minimal similarity kandidat #1 dan #2 (0 = ambiguity rule disabled)
+RECOGNITION_MIN_MARGIN = float(os.getenv('FACE_RECOGNITION_MIN_MARGIN', '0'))
+
+# Employee reads tidak butuh template (belum di-migrate = nested doubles ~20 KB per employee)
+EMPLOYEE_PROJECTION = {'face_embeddings': 0}
+
 class MongoDBManager:
     def __init__(self):
         self.client = MongoClient(os.getenv('MONGODB_URI'))
         self.db = self.client[os.getenv('DATABASE_NAME')]
         self.employees = self.db.employees
+        self.face_templates = self.db.face_templates  # packed binary templates per employee per dimensi
         self.attendance = self.db.attendance
         self.analytics = self.db.analytics
         self.system_logs = self.db.system_logs
         self.settings = self.db.settings
         self.pending_attendance = self.db.pending_attendance
+        self.gallery = GalleryIndex()
+        self._gallery_boot_lock = threading.Lock()
         
         self._create_indexes()
         self._init_default_settings()
@@ -124,6 +141,8 @@ class MongoDBManager:
     def _create_indexes(self):
         """Create necessary indexes untuk struktur baru"""
         self.employees.create_index('employee_id', unique=True)
+        self.employees.create_index('last_updated')
+        self.face_templates.create_index([('employee_id', 1), ('generation', 1), ('dim', 1)], unique=True)
         self.attendance.create_index('employee_id')
         self.attendance.create_index('timestamp')
         self.attendance.create_index([('timestamp', -1)])
@@ -268,6 +287,7 @@ class MongoDBManager:
         try:
             last_employee = self.employees.find_one(
                 {'employee_id': {'$regex': '^EMP-'}}, 
+                {'employee_id': 1},
                 sort=[("employee_id", -1)]
             )
             
@@ -291,6 +311,15 @@ class MongoDBManager:
         try:
             employee_id = self.get_next_employee_id()
             
+            # Float32 arrays dari FaceEngine -> list untuk BSON
+            if isinstance(face_embeddings, np.ndarray):
+                face_embeddings = face_embeddings.tolist()
+            elif isinstance(face_embeddings, list):
+                face_embeddings = [
+                    emb.tolist() if isinstance(emb, np.ndarray) else emb
+                    for emb in face_embeddings
+                ]
+            
             # Handle both single dan multiple embeddings
             if isinstance(face_embeddings, list):
                 if len(face_embeddings) > 0 and isinstance(face_embeddings[0], list):
@@ -327,16 +356,26 @@ class MongoDBManager:
                 'position': position,
                 'email': email,
                 'phone': phone,
-                'face_embeddings': embeddings_to_store,  # Store as array of arrays
                 'embedding_count': embedding_count,
                 'embedding_dimensions': len(embeddings_to_store[0]),
                 'created_at': datetime.now(),
                 'last_updated': datetime.now()
             }
             
+            # Employee document dulu: unique index employee_id meng-claim id, jadi
+            # registrasi concurrent dengan id yang sama gagal sebelum menyentuh template
             result = self.employees.insert_one(employee_data)
             
             if result.inserted_id:
+                # Template disimpan terpisah sebagai packed binary, employee document tetap kecil
+                try:
+                    templates = self._store_templates(employee_id, embeddings_to_store)
+                except Exception:
+                    # Jangan tinggalkan employee tanpa template
+                    self.employees.delete_one({'_id': result.inserted_id})
+                    raise
+                
+                self.gallery.upsert(dict(employee_data, templates=templates))
                 print(f"✅ Employee registered: {employee_id} - {name}")
                 print(f"   Embeddings: {embedding_count} x {len(embeddings_to_store[0])}D")
                 return {
@@ -353,10 +392,105 @@ class MongoDBManager:
             traceback.print_exc()
             return {'success': False, 'error': str(e)}
 
+    def _group_embeddings(self, embeddings):
+        """Group embeddings per dimensi -> {dim: float32 matrix [count, dim]}"""
+        grouped = {}
+        for embedding in embeddings:
+            grouped.setdefault(len(embedding), []).append(embedding)
+        return {dim: np.asarray(rows, dtype=np.float32) for dim, rows in grouped.items()}
+
+    def _store_templates(self, employee_id, embeddings, dtype=TEMPLATE_DTYPE):
+        """
+        Simpan (replace) template employee di collection face_templates
+        
+        Satu document per dimensi: {employee_id, generation, generation_size,
+        dim, count, dtype, model_version, data}
+        
+        Generation baru di-insert dulu, baru generation lama dihapus. Reader
+        (gallery load / sync) hanya memakai generation lengkap terbaru, jadi
+        tidak pernah melihat employee tanpa template di tengah replace.
+        
+        Returns:
+            list of float32 matrices (sudah di-roundtrip lewat storage dtype)
+        """
+        generation = time_module.time_ns()
+        grouped = self._group_embeddings(embeddings)
+        documents = []
+        templates = []
+        for dim, matrix in grouped.items():
+            document = pack_templates(matrix, dtype)
+            document.update({
+                'employee_id': employee_id,
+                'generation': generation,
+                'generation_size': len(grouped),
+                'created_at': datetime.now()
+            })
+            documents.append(document)
+            templates.append(unpack_templates(document))
+        
+        if documents:
+            try:
+                self.face_templates.insert_many(documents)
+            except Exception:
+                # Generation setengah jadi diabaikan reader, tapi jangan ditinggal
+                self.face_templates.delete_many({'employee_id': employee_id, 'generation': generation})
+                raise
+        self.face_templates.delete_many({'employee_id': employee_id, 'generation': {'$ne': generation}})
+        return templates
+
+    def migrate_face_templates(self, dtype=TEMPLATE_DTYPE, dry_run=False, keep_legacy=False):
+        """
+        Pindahkan face_embeddings (nested BSON doubles) ke collection face_templates
+        
+        Handle semua format lama: single embedding flat list, array of
+        embeddings, dan template 128D.
+        
+        Args:
+            dtype: Storage dtype ('float32' atau 'float16')
+            dry_run: Hanya hitung, tidak menulis apa-apa
+            keep_legacy: Jangan $unset face_embeddings setelah migrate
+            
+        Returns:
+            dict: {'success', 'migrated', 'templates', 'skipped', 'failed'}
+        """
+        stats = {'migrated': 0, 'templates': 0, 'skipped': 0, 'failed': 0}
+        legacy = self.employees.find(
+            {'face_embeddings': {'$exists': True}},
+            {'_id': 1, 'employee_id': 1, 'face_embeddings': 1}
+        )
+        
+        for employee in legacy:
+            employee_id = employee.get('employee_id')
+            embeddings = templates_from_document(employee)
+            if employee_id is None or not embeddings:
+                stats['skipped'] += 1
+                continue
+            
+            try:
+                if not dry_run:
+                    self._store_templates(employee_id, embeddings, dtype)
+                    update = {'$set': {
+                        'embedding_count': len(embeddings),
+                        'embedding_dimensions': len(embeddings[0])
+                    }}
+                    if not keep_legacy:
+                        update['$unset'] = {'face_embeddings': ''}
+                    self.employees.update_one({'_id': employee['_id']}, update)
+                stats['migrated'] += 1
+                stats['templates'] += len(embeddings)
+            except Exception as e:
+                print(f"❌ Error migrating templates for {employee_id}: {e}")
+                stats['failed'] += 1
+        
+        print(f"{'🔎 [dry run] ' if dry_run else '✅ '}Face templates migrated: "
+              f"{stats['migrated']} employees, {stats['templates']} templates "
+              f"({stats['skipped']} skipped, {stats['failed']} failed)")
+        return dict(stats, success=stats['failed'] == 0)
+
     def get_all_employees(self):
         """Get all employees"""
         try:
-            employees = list(self.employees.find())
+            employees = list(self.employees.find({}, EMPLOYEE_PROJECTION))
             for emp in employees:
                 emp['_id'] = str(emp['_id'])
                 if 'created_at' in emp and emp['created_at']:
@@ -420,13 +554,186 @@ class MongoDBManager:
             traceback.print_exc()
             return 0.0
         
-    def recognize_face(self, face_embedding, threshold=0.6):
+    def _load_gallery_documents(self, query=None):
+        """
+        Employee documents yang dibutuhkan gallery index (tanpa field lain)
+        
+        Packed template dari face_templates di-attach sebagai 'templates';
+        face_embeddings hanya ada di document yang belum di-migrate.
+        """
+        projection = {
+            '_id': 0,
+            'employee_id': 1,
+            'name': 1,
+            'department': 1,
+            'position': 1,
+            'email': 1,
+            'phone': 1,
+            'face_embeddings': 1
+        }
+        employees = list(self.employees.find(query or {}, projection))
+        
+        template_query = {}
+        if query:
+            template_query = {'employee_id': {'$in': [employee.get('employee_id') for employee in employees]}}
+        # {employee_id: {generation: [documents]}}; replace yang sedang jalan bisa
+        # meninggalkan dua generation sementara
+        generations = {}
+        for document in self.face_templates.find(template_query, {'_id': 0, 'created_at': 0}):
+            generations.setdefault(document['employee_id'], {}).setdefault(
+                document.get('generation', 0), []
+            ).append(document)
+        
+        packed = {}
+        for employee_id, by_generation in generations.items():
+            for generation in sorted(by_generation, reverse=True):
+                documents = by_generation[generation]
+                if len(documents) >= documents[0].get('generation_size', len(documents)):
+                    packed[employee_id] = [unpack_templates(document) for document in documents]
+                    break
+        
+        for employee in employees:
+            templates = packed.get(employee.get('employee_id'))
+            if templates:
+                employee['templates'] = templates
+                employee.pop('face_embeddings', None)  # migrate --keep-legacy
+        return employees
+
+    def _gallery_high_water_mark(self):
+        """'last_updated' terbaru di collection employees (None jika kosong)"""
+        latest = self.employees.find_one(
+            {'last_updated': {'$ne': None}},
+            {'_id': 0, 'last_updated': 1},
+            sort=[('last_updated', -1)]
+        )
+        return latest['last_updated'] if latest else None
+
+    def reload_gallery(self):
+        """Full reload gallery index dari database (dan tulis ulang on-disk snapshot)"""
+        # Diambil sebelum load: perubahan selama load akan di-apply lagi saat boot berikutnya
+        high_water_mark = self._gallery_high_water_mark()
+        self.gallery.load(self._load_gallery_documents())
+        if SNAPSHOT_DIR:
+            self._save_gallery_snapshot(high_water_mark)
+
+    def refresh_gallery_employee(self, employee_id):
+        """
+        Sinkronkan satu employee di gallery dengan state database saat ini
+
+        Idempotent: upsert jika employee ada, remove jika sudah dihapus.
+
+        Returns:
+            str: 'upserted', 'removed', atau 'unchanged'
+        """
+        if not self.gallery.loaded:
+            return 'unchanged'
+        documents = self._load_gallery_documents({'employee_id': employee_id})
+        if documents:
+            self.gallery.upsert(documents[0])
+            return 'upserted'
+        return 'removed' if self.gallery.remove(employee_id) else 'unchanged'
+
+    def reconcile_gallery_deletes(self):
+        """
+        Hapus employee dari gallery yang sudah tidak ada di database
+
+        Delete event hanya membawa _id, jadi employee_id dicocokkan ulang
+        lewat distinct (indexed, tanpa membaca document).
+
+        Returns:
+            int: Jumlah employee yang di-remove
+        """
+        if not self.gallery.loaded:
+            return 0
+        existing = set(self.employees.distinct('employee_id'))
+        stale = [employee_id for employee_id in self.gallery.snapshot.index_of if employee_id not in existing]
+        for employee_id in stale:
+            self.gallery.remove(employee_id)
+        return len(stale)
+
+    def _save_gallery_snapshot(self, high_water_mark):
+        try:
+            save_gallery_snapshot(self.gallery.snapshot, high_water_mark, SNAPSHOT_DIR)
+            return True
+        except Exception as e:
+            print(f"⚠️ Error saving gallery snapshot: {e}")
+            return False
+
+    def _restore_gallery_snapshot(self):
+        """
+        Map on-disk gallery snapshot lalu apply perubahan sejak snapshot dibuat
+        
+        Returns:
+            bool: False jika snapshot tidak ada / tidak bisa dipakai (caller harus full reload)
+        """
+        stored = load_gallery_snapshot(SNAPSHOT_DIR)
+        if stored is None or stored['high_water_mark'] is None:
+            return False
+
+        high_water_mark = self._gallery_high_water_mark()
+        self.gallery.restore(stored['employees'], stored['matrices'], stored['owners'])
+
+        changed = 0
+        for employee in self._load_gallery_documents({'last_updated': {'$gt': stored['high_water_mark']}}):
+            self.gallery.upsert(employee)
+            changed += 1
+
+        # Delete tidak terlihat lewat high-water mark; jumlah yang beda berarti snapshot basi
+        if self.employees.count_documents({}) != self.gallery.snapshot.employee_count:
+            print("⚠️ Gallery snapshot out of sync with database, doing full reload")
+            return False
+
+        print(f"✅ Gallery snapshot mapped from {stored['path']} ({changed} employees changed since snapshot)")
+
+        # Perubahan di-apply ke private copy; tulis snapshot baru dan map ulang
+        # supaya worker berikutnya (dan worker ini) kembali share pages
+        if changed and self._save_gallery_snapshot(high_water_mark):
+            stored = load_gallery_snapshot(SNAPSHOT_DIR)
+            if stored is not None:
+                self.gallery.restore(stored['employees'], stored['matrices'], stored['owners'])
+        return True
+
+    def ensure_gallery(self):
+        """Lazy load gallery: on-disk snapshot jika ada, fallback full load dari database"""
+        if self.gallery.loaded:
+            return
+        with self._gallery_boot_lock:
+            if self.gallery.loaded:
+                return
+            if SNAPSHOT_DIR:
+                try:
+                    if self._restore_gallery_snapshot():
+                        return
+                except Exception as e:
+                    print(f"⚠️ Error restoring gallery snapshot: {e}")
+                    traceback.print_exc()
+            self.reload_gallery()
+
+    def recognize_face(self, face_embedding, threshold=0.6, top_k=RECOGNITION_TOP_K, min_margin=RECOGNITION_MIN_MARGIN):
+        """
+        Recognize satu face terhadap gallery
+        
+        Top-k kandidat dan margin (#1 - #2) dihitung dari gallery pass yang
+        sama dengan best match, jadi tidak ada search tambahan. Dengan
+        approximate backend (ivf / centroid) runner-up bisa tidak ada di
+        shortlist, jadi margin-nya hanya perkiraan (terlalu besar); jika
+        min_margin > 0, pass tersebut diganti satu exact pass.
+        
+        Args:
+            face_embedding: Embedding [512] (atau [128] legacy)
+            threshold: Minimal similarity
+            top_k: Jumlah kandidat di response
+            min_margin: Jika > 0, match dengan margin lebih kecil dianggap ambiguous (ditolak)
+            
+        Returns:
+            dict: {'success', 'employee' | 'similarity', 'candidates', 'margin', 'ambiguous', ...}
+        """
         try:
             print(f"🔍 Recognizing face - embedding size: {len(face_embedding)}")
             
-            employees = list(self.employees.find())
+            self.ensure_gallery()
             
-            if len(employees) == 0:
+            if self.gallery.snapshot.employee_count == 0:
                 print("⚠️ No employees registered in database")
                 return {
                     'success': False,
@@ -434,65 +741,60 @@ class MongoDBManager:
                     'similarity': 0
                 }
             
-            best_match = None
-            highest_similarity = 0
+            # Satu matrix-vector product terhadap semua template + grouped max per employee;
+            # minimal 2 kandidat supaya margin selalu bisa dihitung
+            exact = min_margin > 0 and self.gallery.approximate
+            matches = self.gallery.search_top_k(face_embedding, max(2, int(top_k)), exact=exact)
+            best_match, highest_similarity = matches[0] if matches else (None, 0.0)
+            margin = highest_similarity - (matches[1][1] if len(matches) > 1 else 0.0)
+            candidates = [
+                {
+                    'employee_id': employee['employee_id'],
+                    'name': employee['name'],
+                    'department': employee.get('department', 'General'),
+                    'similarity': similarity
+                }
+                for employee, similarity in matches[:max(1, int(top_k))]
+            ]
             
-            for employee in employees:
-                if 'face_embeddings' not in employee or not employee['face_embeddings']:
-                    continue
-                
-                embeddings = employee['face_embeddings']
-                
-                # Handle both old format (single embedding) and new format (array of embeddings)
-                if not isinstance(embeddings[0], list):
-                    # Old format: single embedding as flat list
-                    embeddings = [embeddings]
-                
-                # Calculate similarity dengan setiap stored embedding
-                max_similarity_for_employee = 0
-                
-                for stored_embedding in embeddings:
-                    # Validate dimensions match
-                    if len(stored_embedding) != len(face_embedding):
-                        print(f"⚠️ Dimension mismatch for {employee['employee_id']}: {len(stored_embedding)} vs {len(face_embedding)}")
-                        continue
-                    
-                    similarity = self.calculate_similarity(face_embedding, stored_embedding)
-                    
-                    if similarity > max_similarity_for_employee:
-                        max_similarity_for_employee = similarity
-                
-                print(f"   {employee['employee_id']} ({employee['name']}): similarity = {max_similarity_for_employee:.3f}")
-                
-                # Update best match jika similarity lebih tinggi DAN melebihi threshold
-                if max_similarity_for_employee > highest_similarity and max_similarity_for_employee >= threshold:
-                    highest_similarity = max_similarity_for_employee
-                    best_match = employee
+            if best_match is not None and highest_similarity < threshold:
+                best_match = None
             
-            if best_match:
+            ambiguous = best_match is not None and min_margin > 0 and margin < min_margin
+            
+            if best_match and not ambiguous:
                 print(f"✅ Match found: {best_match['name']} ({best_match['employee_id']})")
-                print(f"   Similarity: {highest_similarity:.3f} (threshold: {threshold})")
+                print(f"   Similarity: {highest_similarity:.3f} (threshold: {threshold}, margin: {margin:.3f})")
                 
                 return {
                     'success': True,
-                    'employee': {
-                        'employee_id': best_match['employee_id'],
-                        'name': best_match['name'],
-                        'department': best_match.get('department', 'General'),
-                        'position': best_match.get('position', ''),
-                        'email': best_match.get('email', ''),
-                        'phone': best_match.get('phone', ''),
-                        'similarity': highest_similarity
-                    },
+                    'employee': self._employee_match(best_match, highest_similarity),
+                    'candidates': candidates,
+                    'margin': margin,
                     'message': 'Face recognized successfully'
                 }
+            elif ambiguous:
+                print(f"⚠️ Ambiguous match: {best_match['name']} margin {margin:.3f} < {min_margin}")
+                return {
+                    'success': False,
+                    'ambiguous': True,
+                    'message': 'Ambiguous match, multiple employees are too similar',
+                    'similarity': highest_similarity,
+                    'threshold': threshold,
+                    'candidates': candidates,
+                    'margin': margin,
+                    'min_margin': min_margin
+                }
             else:
                 print(f"⚠️ No match found. Best similarity: {highest_similarity:.3f} (threshold: {threshold})")
                 return {
                     'success': False,
+                    'ambiguous': False,
                     'message': 'No matching employee found',
                     'similarity': highest_similarity,
-                    'threshold': threshold
+                    'threshold': threshold,
+                    'candidates': candidates,
+                    'margin': margin
                 }
                 
         except Exception as e:
@@ -500,15 +802,86 @@ class MongoDBManager:
             traceback.print_exc()
             return {'success': False, 'error': str(e)}
         
+    def _employee_match(self, employee, similarity):
+        """Employee fields yang dikembalikan untuk face yang ter-recognize"""
+        return {
+            'employee_id': employee['employee_id'],
+            'name': employee['name'],
+            'department': employee.get('department', 'General'),
+            'position': employee.get('position', ''),
+            'email': employee.get('email', ''),
+            'phone': employee.get('phone', ''),
+            'similarity': similarity
+        }
+    
+    def recognize_faces(self, face_embeddings, threshold=0.6):
+        """
+        Recognize beberapa face sekaligus (group check-in)
+        
+        Semua face di-match dengan satu matrix-matrix product. Satu employee
+        hanya di-assign ke face dengan similarity tertinggi.
+        
+        Args:
+            face_embeddings: List of embeddings [512]
+            threshold: Minimal similarity
+            
+        Returns:
+            list of dict: per face, format sama dengan recognize_face()
+        """
+        try:
+            print(f"🔍 Recognizing {len(face_embeddings)} faces in one batch")
+            
+            self.ensure_gallery()
+            matches = self.gallery.search_many(face_embeddings)
+            
+            # Employee yang muncul di beberapa face: ambil similarity tertinggi
+            assigned = {}
+            for idx, (employee, similarity) in enumerate(matches):
+                if employee is None or similarity < threshold:
+                    continue
+                current = assigned.get(employee['employee_id'])
+                if current is None or similarity > matches[current][1]:
+                    assigned[employee['employee_id']] = idx
+            
+            results = []
+            for idx, (employee, similarity) in enumerate(matches):
+                if employee is not None and assigned.get(employee['employee_id']) == idx:
+                    results.append({
+                        'success': True,
+                        'employee': self._employee_match(employee, similarity),
+                        'message': 'Face recognized successfully'
+                    })
+                else:
+                    duplicate = employee is not None and employee['employee_id'] in assigned
+                    results.append({
+                        'success': False,
+                        'message': 'Employee already matched to another face' if duplicate
+                                   else 'No matching employee found',
+                        'similarity': similarity,
+                        'threshold': threshold
+                    })
+            
+            print(f"✅ Recognized {len(assigned)}/{len(face_embeddings)} faces")
+            return results
+            
+        except Exception as e:
+            print(f"❌ Error recognizing faces: {e}")
+            traceback.print_exc()
+            return [{'success': False, 'error': str(e)} for _ in face_embeddings]
+        
     # ==================== ATTENDANCE LOGGING ====================
     
-    def record_attendance_auto(self, employee_id, confidence=0.0):
+    def record_attendance_auto(self, employee_id, confidence=0.0, employee=None):
         """
         ✅ FIXED: Auto-sync to DynamoDB when checkout is completed
+        
+        employee: Optional employee data yang sudah di-load (mis. hasil
+        recognize_face), supaya tidak perlu query employees lagi
         """
         try:
             # Ambil employee data
-            employee = self.employees.find_one({'employee_id': employee_id})
+            if employee is None or employee.get('employee_id') != employee_id:
+                employee = self.employees.find_one({'employee_id': employee_id}, EMPLOYEE_PROJECTION)
             if not employee:
                 print(f"❌ Employee {employee_id} not found in database")
                 return {'success': False, 'error': f'Employee {employee_id} not found'}
@@ -696,6 +1069,185 @@ class MongoDBManager:
             return {'success': False, 'error': str(e)}
 
 
+    def record_attendance_bulk(self, employees, cooldown_seconds=0):
+        """
+        Auto check-in / check-out untuk beberapa employee sekaligus (group check-in)
+        
+        Logic sama dengan record_attendance_auto, tapi existing records
+        diambil dengan satu query dan semua update ditulis dengan satu
+        bulk_write.
+        
+        Args:
+            employees: List of employee dicts (hasil recognize_faces), minimal 'employee_id'
+            cooldown_seconds: Employee yang check-in / check-out terakhirnya lebih baru
+                dari ini di-skip (scan ulang grup yang sama tidak langsung jadi check-out)
+            
+        Returns:
+            dict: {
+                'success': True,
+                'results': {employee_id: result seperti record_attendance_auto},
+                'checked_in': int,
+                'checked_out': int,
+                'skipped': int
+            }
+        """
+        try:
+            employees = {employee['employee_id']: employee for employee in employees}
+            if not employees:
+                return {'success': True, 'results': {}, 'checked_in': 0, 'checked_out': 0, 'skipped': 0}
+            
+            today_str = datetime.now().strftime('%Y-%m-%d')
+            timestamp = datetime.now()
+            employee_ids = list(employees.keys())
+            
+            print(f"\n{'='*60}")
+            print(f"📝 RECORD_ATTENDANCE_BULK - {len(employee_ids)} employees")
+            print(f"{'='*60}")
+            
+            existing_records = {
+                record['employee_id']: record
+                for record in self.attendance.find({'employee_id': {'$in': employee_ids}, 'date': today_str})
+            }
+            
+            # Semua record di batch ini pakai timestamp yang sama, jadi status cukup dihitung sekali
+            status_by_action = {
+                action: self.calculate_attendance_status(timestamp, action)
+                for action in ('check_in', 'check_out')
+            }
+            
+            operations = []
+            results = {}
+            
+            for employee_id, employee in employees.items():
+                employee_name = employee.get('name', 'Unknown Employee')
+                existing_record = existing_records.get(employee_id)
+                
+                if existing_record and cooldown_seconds > 0:
+                    last_event = existing_record.get('checkout') or existing_record.get('checkin')
+                    if last_event and last_event.get('timestamp'):
+                        last_time = datetime.fromisoformat(last_event['timestamp'].replace('Z', '+00:00'))
+                        elapsed = (timestamp - last_time).total_seconds()
+                        if elapsed < cooldown_seconds:
+                            results[employee_id] = {
+                                'success': True,
+                                'message': f'Already recorded {int(elapsed)}s ago, skipped (cooldown)',
+                                'action': 'skipped',
+                                'employee_name': employee_name
+                            }
+                            continue
+                
+                if existing_record and existing_record.get('checkin') and not existing_record.get('checkout'):
+                    status = status_by_action['check_out']
+                    update_fields = {
+                        'checkout': {
+                            'status': status,
+                            'timestamp': timestamp.isoformat()
+                        },
+                        'updatedAt': timestamp,
+                        'updated_at': timestamp
+                    }
+                    
+                    checkin_time = datetime.fromisoformat(
+                        existing_record['checkin']['timestamp'].replace('Z', '+00:00')
+                    )
+                    work_duration = int((timestamp - checkin_time).total_seconds() / 60)
+                    update_fields['work_duration_minutes'] = work_duration
+                    
+                    operations.append(UpdateOne(
+                        {'employee_id': employee_id, 'date': today_str},
+                        {'$set': update_fields}
+                    ))
+                    results[employee_id] = {
+                        'success': True,
+                        'message': 'Check-out recorded',
+                        'action': 'check_out',
+                        'status': status,
+                        'employee_name': employee_name,
+                        'synced_to_dynamodb': False,
+                        'work_duration_minutes': work_duration,
+                        'data': update_fields
+                    }
+                else:
+                    status = status_by_action['check_in']
+                    record_data = {
+                        'employee_id': employee_id,
+                        'employee_name': employee_name,
+                        'date': today_str,
+                        'checkin': {
+                            'status': status,
+                            'timestamp': timestamp.isoformat()
+                        },
+                        'createdAt': timestamp,
+                        'updatedAt': timestamp,
+                        'updated_at': timestamp
+                    }
+                    
+                    operations.append(UpdateOne(
+                        {'employee_id': employee_id, 'date': today_str},
+                        {'$set': record_data},
+                        upsert=True
+                    ))
+                    results[employee_id] = {
+                        'success': True,
+                        'message': 'Check-in recorded',
+                        'action': 'check_in',
+                        'status': status,
+                        'employee_name': employee_name,
+                        'synced_to_dynamodb': False,
+                        'data': record_data
+                    }
+            
+            if operations:
+                self.attendance.bulk_write(operations, ordered=False)
+            
+            checked_in = [employee_id for employee_id, result in results.items() if result['action'] == 'check_in']
+            checked_out = [employee_id for employee_id, result in results.items() if result['action'] == 'check_out']
+            skipped = len(results) - len(checked_in) - len(checked_out)
+            print(f"✅ Bulk attendance written - {len(checked_in)} check-in, {len(checked_out)} check-out, "
+                  f"{skipped} skipped")
+            
+            # ✅ KIRIM NOTIFIKASI UNTUK YANG LATE
+            lateness_minutes = 0
+            if status_by_action['check_in'] == 'late' and checked_in:
+                lateness_minutes = self.calculate_lateness_minutes(timestamp)
+            if lateness_minutes > 0:
+                for employee_id in checked_in:
+                    employee = employees[employee_id]
+                    try:
+                        send_all_notifications(
+                            employee_name=employee.get('name', 'Unknown Employee'),
+                            employee_email=employee.get('email'),
+                            lateness_minutes=lateness_minutes
+                        )
+                    except Exception as notif_error:
+                        print(f"⚠️ Failed to send notification: {notif_error}")
+                        traceback.print_exc()
+            
+            # ✅ AUTO-SYNC CHECK-OUT KE DYNAMODB
+            if checked_out:
+                try:
+                    import sync_mongo_to_dynamo
+                    for record in self.attendance.find({'employee_id': {'$in': checked_out}, 'date': today_str}):
+                        results[record['employee_id']]['synced_to_dynamodb'] = bool(
+                            sync_mongo_to_dynamo.sync_single_record(record)
+                        )
+                except Exception as sync_error:
+                    print(f"❌ Auto-sync error (but local save is OK): {sync_error}")
+                    traceback.print_exc()
+            
+            return {
+                'success': True,
+                'results': results,
+                'checked_in': len(checked_in),
+                'checked_out': len(checked_out),
+                'skipped': skipped
+            }
+            
+        except Exception as e:
+            print(f"❌ Error recording bulk attendance: {e}")
+            traceback.print_exc()
+            return {'success': False, 'error': str(e)}
+    
     def get_all_attendance(self):
         """Ambil semua data attendance (format baru)."""
         try:
@@ -846,7 +1398,7 @@ class MongoDBManager:
                 
                 # ✅ FALLBACK: JIKA EMPLOYEE_NAME MASIH NULL, CARI DARI EMPLOYEES COLLECTION
                 if not employee_name or employee_name == 'Unknown Employee':
-                    employee_data = self.employees.find_one({'employee_id': employee_id})
+                    employee_data = self.employees.find_one({'employee_id': employee_id}, EMPLOYEE_PROJECTION)
                     if employee_data:
                         employee_name = employee_data.get('name', 'Unknown Employee')
                         # ✅ AUTO-UPDATE RECORD YANG MASIH BERMASALAH
@@ -1057,7 +1609,7 @@ class MongoDBManager:
         """Add attendance record to pending collection untuk approval manual"""
         try:
             # Cari employee berdasarkan nama
-            employee = self.employees.find_one({'name': employee_name})
+            employee = self.employees.find_one({'name': employee_name}, EMPLOYEE_PROJECTION)
             
             if not employee:
                 return {
@@ -0,0 +1,127 @@
+import json
+import os
+import onnxruntime
+
+
+# Execution-provider profiles (urutan = prioritas, CPU selalu sebagai fallback)
+PROVIDER_PROFILES = {
+    'cpu': ['CPUExecutionProvider'],
+    'cuda': ['CUDAExecutionProvider', 'CPUExecutionProvider'],
+    'tensorrt': ['TensorrtExecutionProvider', 'CUDAExecutionProvider', 'CPUExecutionProvider'],
+    'openvino': ['OpenVINOExecutionProvider', 'CPUExecutionProvider'],
+}
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disabled': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+# Default eksplisit: thread dibatasi supaya beberapa worker di host besar
+# tidak saling oversubscribe core, dan thread tidak spin saat idle
+DEFAULT_SESSION_OPTIONS = {
+    'intra_op_num_threads': min(4, os.cpu_count() or 1),
+    'inter_op_num_threads': 1,
+    'graph_optimization_level': 'all',
+    'execution_mode': 'sequential',
+    'enable_cpu_mem_arena': True,
+    'enable_mem_pattern': True,
+    'allow_spinning': False,
+}
+
+# Env override untuk session options global (per-model hanya lewat config file)
+SESSION_ENV_VARS = {
+    'intra_op_num_threads': ('FACE_ORT_INTRA_OP_THREADS', int),
+    'inter_op_num_threads': ('FACE_ORT_INTER_OP_THREADS', int),
+    'graph_optimization_level': ('FACE_ORT_GRAPH_OPT_LEVEL', str),
+    'execution_mode': ('FACE_ORT_EXECUTION_MODE', str),
+    'enable_cpu_mem_arena': ('FACE_ORT_MEM_ARENA', lambda value: value.lower() == 'true'),
+    'enable_mem_pattern': ('FACE_ORT_MEM_PATTERN', lambda value: value.lower() == 'true'),
+    'allow_spinning': ('FACE_ORT_ALLOW_SPINNING', lambda value: value.lower() == 'true'),
+}
+
+
+def load_engine_config(config_path=None):
+    """
+    Load ONNX Runtime config untuk FaceEngine
+
+    Urutan prioritas: default < JSON file (FACE_ENGINE_CONFIG) < env vars.
+    Format file:
+        {
+            "provider_profile": "cpu",
+            "session": {"intra_op_num_threads": 4, ...},
+            "models": {"detection": {"intra_op_num_threads": 2}, ...}
+        }
+
+    Returns:
+        dict: {'provider_profile', 'providers', 'session', 'models'}
+    """
+    config = {
+        'provider_profile': 'cpu',
+        'session': dict(DEFAULT_SESSION_OPTIONS),
+        'models': {},
+    }
+
+    config_path = config_path or os.getenv('FACE_ENGINE_CONFIG')
+    if config_path:
+        with open(config_path) as config_file:
+            file_config = json.load(config_file)
+        config['provider_profile'] = file_config.get('provider_profile', config['provider_profile'])
+        config['session'].update(file_config.get('session', {}))
+        config['models'] = file_config.get('models', {})
+        print(f"⚙️ Face engine config loaded from {config_path}")
+
+    config['provider_profile'] = os.getenv('FACE_ORT_PROFILE', config['provider_profile'])
+    for option, (env_var, parse) in SESSION_ENV_VARS.items():
+        if os.getenv(env_var):
+            config['session'][option] = parse(os.getenv(env_var))
+
+    if config['provider_profile'] not in PROVIDER_PROFILES:
+        raise ValueError(f"Unknown provider profile: {config['provider_profile']}")
+
+    # Provider yang tidak tersedia di build onnxruntime ini di-skip
+    available = onnxruntime.get_available_providers()
+    config['providers'] = [
+        provider for provider in PROVIDER_PROFILES[config['provider_profile']]
+        if provider in available
+    ] or ['CPUExecutionProvider']
+
+    return config
+
+
+def model_session_options(config, taskname):
+    """Session options efektif untuk satu model (global + override per model)"""
+    options = dict(config['session'])
+    options.update(config['models'].get(taskname, {}))
+    return options
+
+
+def build_session_options(options):
+    """Dict of options -> onnxruntime.SessionOptions"""
+    sess_options = onnxruntime.SessionOptions()
+    sess_options.intra_op_num_threads = int(options['intra_op_num_threads'])
+    sess_options.inter_op_num_threads = int(options['inter_op_num_threads'])
+    sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[options['graph_optimization_level']]
+    sess_options.execution_mode = EXECUTION_MODES[options['execution_mode']]
+    sess_options.enable_cpu_mem_arena = bool(options['enable_cpu_mem_arena'])
+    sess_options.enable_mem_pattern = bool(options['enable_mem_pattern'])
+
+    spinning = '1' if options['allow_spinning'] else '0'
+    sess_options.add_session_config_entry('session.intra_op.allow_spinning', spinning)
+    sess_options.add_session_config_entry('session.inter_op.allow_spinning', spinning)
+    return sess_options
+
+
+def create_session(model_file, options, providers):
+    """Buat InferenceSession dengan session options eksplisit"""
+    return onnxruntime.InferenceSession(
+        model_file,
+        sess_options=build_session_options(options),
+        providers=providers
+    )
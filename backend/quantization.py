@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from insightface.utils import face_align
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+
+from ort_config import create_session
+
+
+# Threshold yang sama dengan /api/recognize-face
+MATCH_THRESHOLD = 0.6
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Pool engines load di background thread masing-masing; INT8 file dibuat sekali
+_quantize_lock = threading.Lock()
+
+
+# ------------------------------------
+# QUANTIZATION
+# ------------------------------------
+def quantized_model_path(model_file):
+    """Path INT8 model di sebelah FP32 model (mis. w600k_r50.int8.onnx)"""
+    root, ext = os.path.splitext(model_file)
+    return f"{root}.int8{ext}"
+
+
+class _BlobCalibrationReader(CalibrationDataReader):
+    """Feed preprocessed blobs (satu per image) ke quantize_static"""
+
+    def __init__(self, input_name, blobs):
+        self._inputs = iter([{input_name: blob} for blob in blobs])
+
+    def get_next(self):
+        return next(self._inputs, None)
+
+
+def quantize_model(model_file, output_file=None, calibration_blobs=None, input_name=None):
+    """
+    Buat INT8 versi dari ONNX model
+
+    Tanpa calibration data dipakai dynamic quantization (weights 8-bit
+    QUInt8 yang didukung ConvInteger kernel CPU, activations di-quantize
+    saat runtime). Dengan calibration blobs dipakai
+    static QDQ quantization, yang biasanya lebih cepat untuk CNN di CPU.
+
+    Args:
+        model_file: Path FP32 .onnx
+        output_file: Path output (default: quantized_model_path(model_file))
+        calibration_blobs: Optional list of preprocessed input blobs [1, 3, H, W]
+        input_name: Nama input model (wajib jika calibration_blobs diberikan)
+
+    Returns:
+        str: Path INT8 model
+    """
+    output_file = output_file or quantized_model_path(model_file)
+    started = time.perf_counter()
+
+    # Tulis ke temp file lalu os.replace: crash di tengah quantization tidak
+    # meninggalkan file setengah jadi yang akan di-load oleh boot berikutnya
+    root, ext = os.path.splitext(output_file)
+    temp_file = f'{root}.tmp-{os.getpid()}-{threading.get_ident()}{ext}'
+
+    try:
+        _quantize_to(model_file, temp_file, calibration_blobs, input_name)
+        os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    print(f"✅ INT8 model written to {output_file} ({time.perf_counter() - started:.1f}s)")
+    return output_file
+
+
+def ensure_quantized_model(model_file):
+    """
+    Path INT8 model, quantize sekali jika belum ada (thread-safe)
+
+    Returns:
+        str: Path INT8 model
+    """
+    output_file = quantized_model_path(model_file)
+    with _quantize_lock:
+        if not os.path.exists(output_file):
+            quantize_model(model_file, output_file)
+    return output_file
+
+
+def _quantize_to(model_file, output_file, calibration_blobs, input_name):
+    if calibration_blobs:
+        print(f"🔧 Static INT8 quantization of {model_file} ({len(calibration_blobs)} calibration samples)...")
+        quantize_static(
+            model_file,
+            output_file,
+            _BlobCalibrationReader(input_name, calibration_blobs),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True
+        )
+    else:
+        print(f"🔧 Dynamic INT8 quantization of {model_file}...")
+        quantize_dynamic(model_file, output_file, weight_type=QuantType.QUInt8)
+
+
+# ------------------------------------
+# EVALUATION
+# ------------------------------------
+def _recognition_blobs(rec_model, aligned_faces):
+    """Preprocessing yang sama dengan ArcFaceONNX.get_feat, satu blob per face"""
+    return [
+        cv2.dnn.blobFromImages(
+            [face], 1.0 / rec_model.input_std, rec_model.input_size,
+            (rec_model.input_mean,) * 3, swapRB=True
+        )
+        for face in aligned_faces
+    ]
+
+
+def _run_embeddings(session, input_name, blobs):
+    embeddings = []
+    timings = []
+    for blob in blobs:
+        started = time.perf_counter()
+        output = session.run(None, {input_name: blob})[0]
+        timings.append((time.perf_counter() - started) * 1000)
+        embeddings.append(output[0])
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-10
+    return embeddings, timings
+
+
+def _latency(timings):
+    return {
+        'p50': round(float(np.percentile(timings, 50)), 2),
+        'p95': round(float(np.percentile(timings, 95)), 2)
+    }
+
+
+def evaluate_quantization(fp32_file, int8_file, rec_model, aligned_faces, providers, session_options, threshold=MATCH_THRESHOLD):
+    """
+    Bandingkan INT8 vs FP32 recognition model pada aligned faces
+
+    Returns:
+        dict: cosine agreement, match-decision agreement pada threshold, dan
+        p50/p95 latency (ms per face) untuk kedua model
+    """
+    blobs = _recognition_blobs(rec_model, aligned_faces)
+
+    fp32_session = create_session(fp32_file, session_options, providers)
+    int8_session = create_session(int8_file, session_options, providers)
+    input_name = fp32_session.get_inputs()[0].name
+
+    # Satu run untuk warm-up supaya latency tidak termasuk first-run cost
+    fp32_session.run(None, {input_name: blobs[0]})
+    int8_session.run(None, {input_name: blobs[0]})
+
+    fp32_embeddings, fp32_timings = _run_embeddings(fp32_session, input_name, blobs)
+    int8_embeddings, int8_timings = _run_embeddings(int8_session, input_name, blobs)
+
+    # Cosine antara embedding FP32 dan INT8 untuk face yang sama
+    agreement = np.sum(fp32_embeddings * int8_embeddings, axis=1)
+
+    # Match decision untuk semua pasangan face (i < j)
+    upper = np.triu_indices(len(aligned_faces), k=1)
+    fp32_matches = (fp32_embeddings @ fp32_embeddings.T)[upper] >= threshold
+    int8_matches = (int8_embeddings @ int8_embeddings.T)[upper] >= threshold
+    pair_count = int(len(fp32_matches))
+
+    return {
+        'faces': len(aligned_faces),
+        'cosine_agreement': {
+            'mean': round(float(np.mean(agreement)), 5),
+            'min': round(float(np.min(agreement)), 5),
+            'p5': round(float(np.percentile(agreement, 5)), 5)
+        },
+        'decision_agreement': {
+            'threshold': threshold,
+            'pairs': pair_count,
+            'agreement_rate': round(float(np.mean(fp32_matches == int8_matches)), 5) if pair_count else None,
+            'fp32_matches': int(np.sum(fp32_matches)),
+            'int8_matches': int(np.sum(int8_matches)),
+            'flipped': int(np.sum(fp32_matches != int8_matches))
+        },
+        'latency_ms': {
+            'fp32': _latency(fp32_timings),
+            'int8': _latency(int8_timings)
+        },
+        'model_size_mb': {
+            'fp32': round(os.path.getsize(fp32_file) / 1e6, 1),
+            'int8': round(os.path.getsize(int8_file) / 1e6, 1)
+        }
+    }
+
+
+def load_aligned_faces(engine, image_dir):
+    """Detect + align face terbesar dari setiap image di image_dir"""
+    rec_model = engine.model.models['recognition']
+    aligned_faces = []
+
+    for filename in sorted(os.listdir(image_dir)):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        with open(os.path.join(image_dir, filename), 'rb') as image_file:
+            image_np = engine.decode_image(image_file.read())
+
+        detection = engine._detect_primary_face(image_np)
+        if detection is None or detection[1] is None:
+            print(f"⚠️ No face in {filename}, skipped")
+            continue
+
+        aligned_faces.append(
+            face_align.norm_crop(image_np, landmark=detection[1], image_size=rec_model.input_size[0])
+        )
+
+    return aligned_faces
+
+
+# ------------------------------------
+# MAIN ENTRY POINT
+# ------------------------------------
+def main():
+    """
+    Quantize recognition model dan print accuracy/latency report
+
+    Usage:
+        python quantization.py --images ./eval_faces [--static] [--output report.json]
+    """
+    parser = argparse.ArgumentParser(description='INT8 quantization + FP32 comparison for the recognition model')
+    parser.add_argument('--images', required=True, help='Directory of face images for calibration/evaluation')
+    parser.add_argument('--static', action='store_true', help='Static QDQ quantization calibrated on --images')
+    parser.add_argument('--detection', action='store_true', help='Also quantize the detection model (dynamic)')
+    parser.add_argument('--threshold', type=float, default=MATCH_THRESHOLD)
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    args = parser.parse_args()
+
+    # Engine FP32 dipakai untuk detection + alignment
+    from face_engine import FaceEngine
+    engine = FaceEngine(quantize=(), background=False)
+    if not engine.is_ready:
+        raise RuntimeError(f"Face engine failed to load: {engine.error}")
+
+    rec_model = engine.model.models['recognition']
+    aligned_faces = load_aligned_faces(engine, args.images)
+    if len(aligned_faces) < 2:
+        raise RuntimeError("Need at least 2 face images for the evaluation")
+
+    calibration_blobs = _recognition_blobs(rec_model, aligned_faces) if args.static else None
+    int8_file = quantize_model(
+        rec_model.model_file,
+        calibration_blobs=calibration_blobs,
+        input_name=rec_model.input_name
+    )
+
+    if args.detection:
+        quantize_model(engine.model.det_model.model_file)
+
+    report = evaluate_quantization(
+        rec_model.model_file,
+        int8_file,
+        rec_model,
+        aligned_faces,
+        engine.ort_config['providers'],
+        engine.ort_config['session'],
+        threshold=args.threshold
+    )
+    report['mode'] = 'static' if args.static else 'dynamic'
+
+    print("\n" + "=" * 60)
+    print("📊 INT8 vs FP32 RECOGNITION REPORT")
+    print("=" * 60)
+    print(json.dumps(report, indent=2))
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"💾 Report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
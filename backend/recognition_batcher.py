@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Window (ms) untuk mengumpulkan crops dari request yang bersamaan (0 = disabled)
+BATCH_WINDOW_MS = float(os.getenv('FACE_REC_BATCH_WINDOW_MS', '5'))
+
+# Max crops per batched recognition inference
+BATCH_MAX_SIZE = int(os.getenv('FACE_REC_BATCH_MAX_SIZE', '16'))
+
+
+class RecognitionBatcher:
+    """
+    Dynamic micro-batching untuk recognition model
+
+    Request thread submit satu aligned crop dan menunggu Future-nya.
+    Satu scheduler thread mengumpulkan crops selama window_ms (atau sampai
+    max_batch_size crops), menjalankan satu batched inference, lalu
+    membagikan embedding ke masing-masing caller.
+    """
+
+    def __init__(self, engines, window_ms=BATCH_WINDOW_MS, max_batch_size=BATCH_MAX_SIZE):
+        self.engines = list(engines)
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._crops = 0
+        self._max_seen = 0
+
+        threading.Thread(target=self._run, name='recognition-batcher', daemon=True).start()
+
+    def _recognition_model(self):
+        for engine in self.engines:
+            if engine.is_ready and engine.has_recognition:
+                return engine.model.models['recognition']
+        raise RuntimeError('No ready face engine with a recognition model')
+
+    def embed(self, aligned_face, timeout=None):
+        """
+        Embed satu aligned crop lewat batch berikutnya
+
+        Returns:
+            numpy array [512] (raw output, belum di-normalize, sama seperti ArcFaceONNX.get)
+        """
+        future = Future()
+        self._queue.put((aligned_face, future))
+        return future.result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                features = self._recognition_model().get_feat([crop for crop, _ in batch])
+                for (_, future), feature in zip(batch, features):
+                    future.set_result(feature)
+            except Exception as e:
+                print(f"❌ Batched recognition failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+            with self._lock:
+                self._batches += 1
+                self._crops += len(batch)
+                self._max_seen = max(self._max_seen, len(batch))
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch_size': self.max_batch_size,
+                'batches': self._batches,
+                'crops': self._crops,
+                'avg_batch_size': round(self._crops / self._batches, 2) if self._batches else 0.0,
+                'max_batch_seen': self._max_seen,
+                'pending': self._queue.qsize()
+            }
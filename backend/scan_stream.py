@@ -0,0 +1,266 @@
+import json
+import os
+import threading
+import time
+import traceback
+from collections import deque
+
+
+# Stream ditutup setelah tidak ada frame dan tidak ada subscriber selama ini (detik)
+STREAM_IDLE_SECONDS = float(os.getenv('FACE_STREAM_IDLE_SECONDS', '30'))
+
+# Jumlah event terakhir yang disimpan untuk subscriber yang reconnect (Last-Event-ID)
+STREAM_EVENT_BUFFER = int(os.getenv('FACE_STREAM_EVENT_BUFFER', '50'))
+
+# Interval SSE keep-alive comment saat tidak ada event
+STREAM_KEEPALIVE_SECONDS = float(os.getenv('FACE_STREAM_KEEPALIVE_SECONDS', '15'))
+
+# Max concurrent stream sessions
+STREAM_MAX_SESSIONS = int(os.getenv('FACE_STREAM_MAX_SESSIONS', '32'))
+
+# recordAttendance: employee yang sama tidak dicatat ulang di stream ini selama cooldown (detik),
+# walaupun face tracker sudah memulai track baru (gap frame, orang bergantian di depan camera).
+# Group check-in (/api/scan/group) memakai cooldown yang sama terhadap record attendance terakhir.
+STREAM_RECORD_COOLDOWN_SECONDS = float(os.getenv('FACE_STREAM_RECORD_COOLDOWN_SECONDS', '300'))
+
+
+class ScanStream:
+    """
+    Satu streaming scan session (biasanya satu kiosk camera)
+
+    Kiosk push frame terus-menerus; hanya frame terbaru yang disimpan. Jika
+    worker masih sibuk dengan frame sebelumnya, frame yang menunggu diganti
+    (dropped), sehingga server work per kiosk dibatasi oleh kecepatan
+    inference, bukan frame rate camera. Hasil tiap frame dipublish sebagai
+    event untuk subscriber SSE.
+    """
+
+    def __init__(self, session_id, process_frame, on_close=None):
+        self.session_id = session_id
+
+        self._process_frame = process_frame
+        self._on_close = on_close
+        self._cond = threading.Condition()
+        self._frame = None
+        self._events = deque(maxlen=STREAM_EVENT_BUFFER)
+        self._event_seq = 0
+        self._subscribers = 0
+        self._closed = False
+        self._last_activity = time.monotonic()
+
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.created_at = time.time()
+
+        threading.Thread(target=self._run, name=f'scan-stream-{session_id}', daemon=True).start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def push_frame(self, image_data, params=None):
+        """
+        Simpan frame terbaru (frame lama yang belum diproses di-drop)
+
+        Returns:
+            bool: True jika frame sebelumnya di-drop
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f'Stream {self.session_id} is closed')
+
+            dropped = self._frame is not None
+            if dropped:
+                self.frames_dropped += 1
+            self._frame = (image_data, params or {})
+            self.frames_received += 1
+            self._last_activity = time.monotonic()
+            self._cond.notify_all()
+            return dropped
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _idle(self):
+        return (self._subscribers == 0
+                and time.monotonic() - self._last_activity > STREAM_IDLE_SECONDS)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._frame is None and not self._closed:
+                    self._cond.wait(timeout=STREAM_IDLE_SECONDS)
+                    if self._frame is None and self._idle():
+                        print(f"⏹️ Scan stream {self.session_id} idle, closing")
+                        self._closed = True
+                if self._closed:
+                    break
+                image_data, params = self._frame
+                self._frame = None
+
+            started = time.perf_counter()
+            try:
+                event = self._process_frame(self, image_data, params)
+            except Exception as e:
+                print(f"❌ Scan stream {self.session_id} frame failed: {e}")
+                traceback.print_exc()
+                event = {'type': 'error', 'error': str(e)}
+
+            if event is not None:
+                event['processing_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                self.publish(event)
+
+            with self._cond:
+                self.frames_processed += 1
+
+        # Bangunkan subscriber supaya mereka menerima 'closed' event
+        with self._cond:
+            self._cond.notify_all()
+        if self._on_close:
+            self._on_close(self)
+
+    def publish(self, event):
+        """Tambahkan event ke buffer dan bangunkan semua subscriber"""
+        with self._cond:
+            self._event_seq += 1
+            event['seq'] = self._event_seq
+            event['session_id'] = self.session_id
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def subscribe(self, last_event_id=0):
+        """
+        Generator Server-Sent Events
+
+        Args:
+            last_event_id: Event seq terakhir yang sudah diterima client (reconnect)
+
+        Yields:
+            str: SSE-formatted messages
+        """
+        with self._cond:
+            self._subscribers += 1
+            self._last_activity = time.monotonic()
+
+        last_seq = last_event_id
+        try:
+            yield "retry: 1000\n\n"
+            while True:
+                with self._cond:
+                    pending = [event for event in self._events if event['seq'] > last_seq]
+                    if not pending and not self._closed:
+                        # Frame push juga notify; tunggu sampai benar-benar ada event baru
+                        self._cond.wait_for(
+                            lambda: self._closed or self._event_seq > last_seq,
+                            timeout=STREAM_KEEPALIVE_SECONDS
+                        )
+                        pending = [event for event in self._events if event['seq'] > last_seq]
+                    closed = self._closed
+
+                if not pending:
+                    if closed:
+                        yield "event: closed\ndata: {}\n\n"
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+
+                for event in pending:
+                    last_seq = event['seq']
+                    yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+                self._last_activity = time.monotonic()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'session_id': self.session_id,
+                'subscribers': self._subscribers,
+                'frames_received': self.frames_received,
+                'frames_dropped': self.frames_dropped,
+                'frames_processed': self.frames_processed,
+                'events': self._event_seq,
+                'closed': self._closed
+            }
+
+
+class ScanStreamManager:
+    """Registry semua aktif ScanStream, keyed by session id"""
+
+    def __init__(self, process_frame, max_sessions=STREAM_MAX_SESSIONS):
+        self.process_frame = process_frame
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._streams = {}
+        # {session_id: {employee_id: monotonic time terakhir dicatat}}; di level manager
+        # supaya cooldown tetap berlaku setelah stream ditutup (idle / DELETE) dan dibuka lagi
+        self._recorded = {}
+
+    def get(self, session_id, create=True):
+        """
+        Ambil stream untuk session, buat baru jika belum ada
+
+        Returns:
+            ScanStream, atau None jika tidak ada (create=False) atau max_sessions tercapai
+        """
+        with self._lock:
+            stream = self._streams.get(session_id)
+            if stream is not None and not stream.closed:
+                return stream
+            if not create or len(self._streams) >= self.max_sessions:
+                return None
+
+            stream = ScanStream(session_id, self.process_frame, on_close=self._remove)
+            self._streams[session_id] = stream
+            print(f"▶️ Scan stream opened: {session_id}")
+            return stream
+
+    def close(self, session_id):
+        with self._lock:
+            stream = self._streams.pop(session_id, None)
+        if stream is None:
+            return False
+        stream.close()
+        return True
+
+    def claim_record(self, session_id, employee_id, cooldown=STREAM_RECORD_COOLDOWN_SECONDS):
+        """
+        Cek dan tandai attendance employee untuk session ini (atomic)
+
+        Returns:
+            bool: True jika employee boleh dicatat (belum dicatat dalam cooldown)
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Buang entry yang sudah lewat cooldown, supaya map tidak tumbuh terus
+            for recorded_session_id, recorded in list(self._recorded.items()):
+                for recorded_employee_id, recorded_at in list(recorded.items()):
+                    if now - recorded_at >= cooldown:
+                        del recorded[recorded_employee_id]
+                if not recorded:
+                    del self._recorded[recorded_session_id]
+
+            recorded = self._recorded.setdefault(session_id, {})
+            if employee_id in recorded:
+                return False
+            recorded[employee_id] = now
+            return True
+
+    def _remove(self, stream):
+        with self._lock:
+            if self._streams.get(stream.session_id) is stream:
+                del self._streams[stream.session_id]
+
+    def get_stats(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        return {
+            'active': len(streams),
+            'max_sessions': self.max_sessions,
+            'recorded_sessions': len(self._recorded),
+            'streams': [stream.get_stats() for stream in streams]
+        }
@@ -0,0 +1,543 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+
+# 'exact' (brute force, default), 'ivf' (approximate inverted-file index),
+# atau 'centroid' (per-employee centroid shortlist + exact re-rank)
+SEARCH_BACKEND = os.getenv('FACE_SEARCH_BACKEND', 'exact')
+
+# Jumlah IVF lists (0 = auto, ~sqrt(templates)) dan lists yang di-scan per query
+IVF_NLIST = int(os.getenv('FACE_IVF_NLIST', '0'))
+IVF_NPROBE = int(os.getenv('FACE_IVF_NPROBE', '16'))
+
+# Di bawah jumlah template ini exact search sudah cukup cepat, IVF tidak di-build
+IVF_MIN_TEMPLATES = int(os.getenv('FACE_IVF_MIN_TEMPLATES', '5000'))
+
+# Spherical k-means training
+IVF_TRAIN_ITERATIONS = int(os.getenv('FACE_IVF_TRAIN_ITERATIONS', '10'))
+IVF_TRAIN_SAMPLE = int(os.getenv('FACE_IVF_TRAIN_SAMPLE', '50000'))
+
+# Trained centroids disimpan di sini supaya restart tidak perlu training ulang
+IVF_INDEX_PATH = os.getenv('FACE_IVF_INDEX_PATH', '')
+
+# Index di-train ulang setelah gallery tumbuh sebesar faktor ini sejak training terakhir
+IVF_RETRAIN_GROWTH = 2.0
+
+# Centroid shortlist: jumlah employee kandidat yang di-re-rank dengan semua template-nya
+CENTROID_TOP_K = int(os.getenv('FACE_CENTROID_TOP_K', '20'))
+
+# Fraksi query yang juga dijalankan exhaustive untuk hit/miss rate (0 = disabled)
+CENTROID_AUDIT_RATE = float(os.getenv('FACE_CENTROID_AUDIT_RATE', '0.01'))
+
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def _top_groups(scores, groups, k):
+    """
+    Top-k dari per-employee best similarity
+
+    Args:
+        scores: Best similarity per kandidat group
+        groups: Group index untuk setiap score
+        k: Jumlah hasil
+
+    Returns:
+        list of tuple: (group, similarity), similarity tertinggi dulu
+    """
+    k = min(int(k), len(scores))
+    if k <= 1:
+        best = int(np.argmax(scores))
+        return [(int(groups[best]), float(scores[best]))]
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [(int(groups[i]), float(scores[i])) for i in top]
+
+
+class ExactSearch:
+    """Brute force: satu matrix product terhadap semua template + grouped max"""
+
+    name = 'exact'
+
+    def index_block(self, block, index=None):
+        return None
+
+    def search(self, block, index, probe):
+        """
+        Returns:
+            tuple: (group index di block, cosine similarity)
+        """
+        return self.search_top_k(block, index, probe, 1)[0]
+
+    def search_top_k(self, block, index, probe, k):
+        """
+        Top-k employee dari grouped max yang sama dengan search()
+
+        Returns:
+            list of tuple: (group index di block, cosine similarity), terbaik dulu
+        """
+        similarities = block.matrix @ probe
+        employee_best = np.maximum.reduceat(similarities, block.starts)
+        return _top_groups(employee_best, np.arange(len(employee_best)), k)
+
+    def search_many(self, block, index, probes):
+        """Matrix-matrix product untuk beberapa probe sekaligus -> list of (group, similarity)"""
+        similarities = block.matrix @ probes.T
+        employee_best = np.maximum.reduceat(similarities, block.starts, axis=0)
+        best_groups = np.argmax(employee_best, axis=0)
+        best_similarities = employee_best[best_groups, np.arange(len(probes))]
+        return [(int(group), float(similarity)) for group, similarity in zip(best_groups, best_similarities)]
+
+    def get_stats(self):
+        return {'backend': self.name}
+
+
+class IVFIndex:
+    """Trained coarse quantizer untuk satu dimensi (centroids sudah normalized)"""
+
+    def __init__(self, centroids, trained_on):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_on = int(trained_on)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+
+class IVFSearch:
+    """
+    Approximate search dengan inverted-file index (IVF)
+
+    Template di-cluster dengan spherical k-means. Query hanya membandingkan
+    template di nprobe cluster terdekat, lalu similarity kandidat dihitung
+    exact dari float32 matrix (re-rank), jadi threshold 0.6 tetap berlaku
+    pada cosine yang sebenarnya. Recall vs latency diatur lewat nprobe.
+
+    Template baru (register) langsung di-assign ke cluster terdekat tanpa
+    training ulang; training ulang hanya saat gallery tumbuh
+    IVF_RETRAIN_GROWTH kali sejak training terakhir.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, nlist=IVF_NLIST, nprobe=IVF_NPROBE, min_templates=IVF_MIN_TEMPLATES,
+                 iterations=IVF_TRAIN_ITERATIONS, train_sample=IVF_TRAIN_SAMPLE, index_path=IVF_INDEX_PATH):
+        self.nlist = nlist
+        self.nprobe = max(1, int(nprobe))
+        self.min_templates = min_templates
+        self.iterations = iterations
+        self.train_sample = train_sample
+        self.index_path = index_path
+        self._exact = ExactSearch()
+        self._indexes = None
+        self._searches = 0
+        self._scanned_rows = 0
+        self._total_rows = 0
+
+    # ------ TRAINING / ASSIGNMENT
+    def _assign(self, centroids, matrix):
+        """Nearest centroid (max cosine) per row, di-chunk supaya memory tetap kecil"""
+        assignments = np.empty(len(matrix), dtype=np.int32)
+        for start in range(0, len(matrix), ASSIGN_CHUNK_ROWS):
+            chunk = matrix[start:start + ASSIGN_CHUNK_ROWS]
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+    def _train(self, matrix):
+        nlist = self.nlist or int(np.sqrt(len(matrix)))
+        nlist = max(1, min(nlist, len(matrix)))
+        rng = np.random.default_rng(0)
+
+        sample = matrix
+        if len(matrix) > self.train_sample:
+            sample = matrix[rng.choice(len(matrix), self.train_sample, replace=False)]
+
+        started = time.perf_counter()
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = self._assign(centroids, sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+
+            # Cluster kosong di-reseed dengan row random
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+            centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-10)
+
+        print(f"🧭 IVF index trained: {nlist} lists on {len(sample)} templates "
+              f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+        return IVFIndex(centroids, len(matrix))
+
+    # ------ PERSISTENCE
+    def save(self):
+        """Simpan trained centroids (semua dimensi) ke index_path (.npz)"""
+        if not self.index_path or not self._indexes:
+            return
+        arrays = {}
+        for dim, index in self._indexes.items():
+            arrays[f'centroids_{dim}'] = index.centroids
+            arrays[f'trained_on_{dim}'] = np.array(index.trained_on)
+        with open(self.index_path, 'wb') as index_file:
+            np.savez(index_file, **arrays)
+        print(f"💾 IVF index saved to {self.index_path}")
+
+    def load(self):
+        """Load trained centroids dari index_path (sekali, lazy)"""
+        if self._indexes is not None:
+            return self._indexes
+
+        self._indexes = {}
+        if self.index_path and os.path.exists(self.index_path):
+            with np.load(self.index_path) as saved:
+                for key in saved.files:
+                    if key.startswith('centroids_'):
+                        dim = int(key[len('centroids_'):])
+                        self._indexes[dim] = IVFIndex(saved[key], int(saved[f'trained_on_{dim}']))
+            print(f"📂 IVF index loaded from {self.index_path} (dims: {sorted(self._indexes)})")
+        return self._indexes
+
+    def index_block(self, block, index=None):
+        """
+        Siapkan IVF index untuk block dan assign template yang belum punya cluster
+
+        Args:
+            block: GalleryBlock (assignments di-update in place, block belum dipublish)
+            index: IVFIndex dari snapshot sebelumnya (None = load dari disk / train)
+
+        Returns:
+            IVFIndex, atau None jika block terlalu kecil (exact search dipakai)
+        """
+        template_count = len(block.owners)
+        if template_count < self.min_templates:
+            return None
+
+        dim = block.matrix.shape[1]
+        if index is None:
+            index = self.load().get(dim)
+
+        if index is None or template_count >= index.trained_on * IVF_RETRAIN_GROWTH:
+            index = self._train(block.matrix)
+            block.assignments[:] = -1
+            self.load()[dim] = index
+            self.save()
+
+        pending = np.flatnonzero(block.assignments < 0)
+        if len(pending):
+            block.assignments[pending] = self._assign(index.centroids, block.matrix[pending])
+        return index
+
+    # ------ SEARCH
+    def _inverted_lists(self, block, index):
+        """Row ids per cluster (CSR), dihitung sekali per block"""
+        lists = block.inverted_lists
+        if lists is None:
+            order = np.argsort(block.assignments, kind='stable').astype(np.int32)
+            offsets = np.searchsorted(block.assignments[order], np.arange(index.nlist + 1))
+            lists = block.inverted_lists = (order, offsets)
+        return lists
+
+    def candidates(self, block, index, probe):
+        """Template rows di nprobe cluster terdekat"""
+        order, offsets = self._inverted_lists(block, index)
+        scores = index.centroids @ probe
+        nprobe = min(self.nprobe, index.nlist)
+        probed = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[cluster]:offsets[cluster + 1]] for cluster in probed])
+
+    def search(self, block, index, probe):
+        return self.search_top_k(block, index, probe, 1)[0]
+
+    def search_top_k(self, block, index, probe, k):
+        if index is None:
+            return self._exact.search_top_k(block, index, probe, k)
+
+        rows = self.candidates(block, index, probe)
+        self._searches += 1
+        self._scanned_rows += len(rows)
+        self._total_rows += len(block.owners)
+        if len(rows) == 0:
+            return self._exact.search_top_k(block, index, probe, k)
+
+        # Exact re-rank: cosine sebenarnya untuk semua kandidat. Row ids diurutkan
+        # supaya template per employee contiguous -> grouped max
+        rows = np.sort(rows)
+        similarities = block.matrix[rows] @ probe
+        groups = np.searchsorted(block.starts, rows, side='right') - 1
+        group_starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+        return _top_groups(np.maximum.reduceat(similarities, group_starts), groups[group_starts], k)
+
+    def search_many(self, block, index, probes):
+        if index is None:
+            return self._exact.search_many(block, index, probes)
+        return [self.search(block, index, probe) for probe in probes]
+
+    def get_stats(self):
+        return {
+            'backend': self.name,
+            'nlist': self.nlist or 'auto',
+            'nprobe': self.nprobe,
+            'min_templates': self.min_templates,
+            'searches': self._searches,
+            'scanned_fraction': round(self._scanned_rows / self._total_rows, 4) if self._total_rows else None
+        }
+
+
+class CentroidIndex:
+    """Satu normalized centroid per employee group, untuk satu GalleryBlock"""
+
+    def __init__(self, block):
+        self.matrix = block.matrix
+        ends = np.append(block.starts[1:], len(block.owners)).astype(np.intp)
+        self.ends = ends
+        sums = np.add.reduceat(block.matrix, block.starts, axis=0) if len(block.starts) else block.matrix[:0]
+        self.centroids = np.ascontiguousarray(
+            sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-10),
+            dtype=np.float32
+        )
+
+
+class CentroidShortlistSearch:
+    """
+    Two-stage search per employee
+
+    Stage 1: probe vs satu centroid per employee, ambil top-K employee.
+    Stage 2: exact max-over-templates hanya untuk K kandidat tersebut.
+
+    Jumlah comparison turun kira-kira sebesar faktor templates-per-employee.
+    Sebagian query (audit_rate) juga dijalankan exhaustive untuk mengukur
+    hit/miss rate shortlist terhadap exact search.
+    """
+
+    name = 'centroid'
+
+    def __init__(self, top_k=CENTROID_TOP_K, audit_rate=CENTROID_AUDIT_RATE):
+        self.top_k = max(1, int(top_k))
+        self.audit_rate = audit_rate
+        self._exact = ExactSearch()
+        self._rng = np.random.default_rng()
+        self._searches = 0
+        self._comparisons = 0
+        self._exhaustive_comparisons = 0
+        self._audited = 0
+        self._audit_hits = 0
+
+    def index_block(self, block, index=None):
+        """Centroids dihitung ulang hanya jika template matrix block berubah"""
+        if index is not None and index.matrix is block.matrix:
+            return index
+        return CentroidIndex(block)
+
+    def search(self, block, index, probe):
+        return self.search_top_k(block, index, probe, 1)[0]
+
+    def search_top_k(self, block, index, probe, k):
+        group_count = len(block.starts)
+        shortlist_size = max(self.top_k, int(k))
+        if index is None or group_count <= shortlist_size:
+            return self._exact.search_top_k(block, index, probe, k)
+
+        # Stage 1: shortlist employee dari centroid similarity
+        shortlist = np.argpartition(-(index.centroids @ probe), shortlist_size - 1)[:shortlist_size]
+
+        # Stage 2: exact max-over-templates untuk kandidat
+        rows = np.concatenate([np.arange(block.starts[group], index.ends[group]) for group in shortlist])
+        lengths = index.ends[shortlist] - block.starts[shortlist]
+        similarities = block.matrix[rows] @ probe
+        candidate_best = np.maximum.reduceat(similarities, np.concatenate(([0], np.cumsum(lengths)[:-1])))
+        results = _top_groups(candidate_best, shortlist, k)
+
+        self._searches += 1
+        self._comparisons += group_count + len(rows)
+        self._exhaustive_comparisons += len(block.owners)
+
+        if self.audit_rate > 0 and self._rng.random() < self.audit_rate:
+            self._audited += 1
+            if self._exact.search(block, index, probe)[0] == results[0][0]:
+                self._audit_hits += 1
+
+        return results
+
+    def search_many(self, block, index, probes):
+        return [self.search(block, index, probe) for probe in probes]
+
+    def get_stats(self):
+        return {
+            'backend': self.name,
+            'top_k': self.top_k,
+            'searches': self._searches,
+            'comparison_fraction': round(self._comparisons / self._exhaustive_comparisons, 4)
+                                   if self._exhaustive_comparisons else None,
+            'audit': {
+                'rate': self.audit_rate,
+                'audited': self._audited,
+                'hits': self._audit_hits,
+                'misses': self._audited - self._audit_hits,
+                'hit_rate': round(self._audit_hits / self._audited, 4) if self._audited else None
+            }
+        }
+
+
+SEARCH_BACKENDS = {
+    'exact': ExactSearch,
+    'ivf': IVFSearch,
+    'centroid': CentroidShortlistSearch,
+}
+
+
+def create_search_backend(name=SEARCH_BACKEND):
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend: {name}")
+    return SEARCH_BACKENDS[name]()
+
+
+# ------------------------------------
+# RECALL REPORT
+# ------------------------------------
+def _latency(timings):
+    return {
+        'p50': round(float(np.percentile(timings, 50)), 3),
+        'p95': round(float(np.percentile(timings, 95)), 3)
+    }
+
+
+def make_queries(gallery, count, noise, seed=0):
+    """
+    Query sintetis: template gallery + gaussian noise (lalu normalize)
+
+    noise 1.0 menghasilkan cosine ~0.7 ke template asal, mirip scan live
+    dibanding template registrasi.
+    """
+    rng = np.random.default_rng(seed)
+    block = max(gallery.snapshot.blocks.values(), key=lambda candidate: len(candidate.owners))
+    rows = rng.choice(len(block.owners), min(count, len(block.owners)), replace=False)
+    queries = block.matrix[rows] + rng.normal(size=(len(rows), block.matrix.shape[1])).astype(np.float32) * (
+        noise / np.sqrt(block.matrix.shape[1])
+    )
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def recall_report(exact_gallery, approximate_gallery, queries, threshold=0.6):
+    """
+    Bandingkan approximate backend dengan exact search
+
+    Returns:
+        dict: recall@1 (employee sama dengan exact), match-decision agreement
+        pada threshold, similarity error, dan p50/p95 latency (ms per query)
+    """
+    exact_results, exact_timings = [], []
+    approximate_results, approximate_timings = [], []
+
+    for probe in queries:
+        started = time.perf_counter()
+        exact_results.append(exact_gallery.search(probe))
+        exact_timings.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        approximate_results.append(approximate_gallery.search(probe))
+        approximate_timings.append((time.perf_counter() - started) * 1000)
+
+    same_employee = [
+        (exact[0] or {}).get('employee_id') == (approximate[0] or {}).get('employee_id')
+        for exact, approximate in zip(exact_results, approximate_results)
+    ]
+    exact_matches = np.array([similarity >= threshold for _, similarity in exact_results])
+    approximate_matches = np.array([similarity >= threshold for _, similarity in approximate_results])
+    similarity_error = np.array([
+        exact[1] - approximate[1] for exact, approximate in zip(exact_results, approximate_results)
+    ])
+
+    return {
+        'queries': len(queries),
+        'templates': exact_gallery.snapshot.template_count,
+        'backend': approximate_gallery.backend.get_stats(),
+        'recall_at_1': round(float(np.mean(same_employee)), 5),
+        'decision_agreement': {
+            'threshold': threshold,
+            'agreement_rate': round(float(np.mean(exact_matches == approximate_matches)), 5),
+            'exact_matches': int(np.sum(exact_matches)),
+            'approximate_matches': int(np.sum(approximate_matches))
+        },
+        'similarity_error': {
+            'mean': round(float(np.mean(similarity_error)), 6),
+            'max': round(float(np.max(similarity_error)), 6)
+        },
+        'latency_ms': {
+            'exact': _latency(exact_timings),
+            'approximate': _latency(approximate_timings)
+        }
+    }
+
+
+def synthetic_employees(count, templates_per_employee=3, dim=512, seed=0):
+    """Gallery sintetis untuk benchmark tanpa database"""
+    rng = np.random.default_rng(seed)
+    for idx in range(count):
+        base = rng.normal(size=dim)
+        yield {
+            'employee_id': f'SYN-{idx:06d}',
+            'name': f'Synthetic {idx}',
+            'face_embeddings': (base + rng.normal(size=(templates_per_employee, dim)) * 0.5).tolist()
+        }
+
+
+# ------------------------------------
+# MAIN ENTRY POINT
+# ------------------------------------
+def main():
+    """
+    Recall/latency report approximate backend vs exact search
+
+    Usage:
+        python search_backends.py [--backend ivf|centroid] [--synthetic 50000] [--nprobe 16 | --top-k 20] [--output report.json]
+    """
+    from gallery_index import GalleryIndex
+
+    parser = argparse.ArgumentParser(description='Approximate vs exact gallery search report')
+    parser.add_argument('--backend', choices=('ivf', 'centroid'), default='ivf')
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N synthetic employees instead of MongoDB')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--noise', type=float, default=1.0, help='Query noise (1.0 ~ cosine 0.7 to the source template)')
+    parser.add_argument('--nlist', type=int, default=IVF_NLIST)
+    parser.add_argument('--nprobe', type=int, default=IVF_NPROBE)
+    parser.add_argument('--top-k', type=int, default=CENTROID_TOP_K)
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        employees = list(synthetic_employees(args.synthetic))
+    else:
+        from mongo_db import db
+        employees = list(db._load_gallery_documents())
+
+    exact_gallery = GalleryIndex(backend=ExactSearch())
+    exact_gallery.load(employees)
+    if args.backend == 'centroid':
+        backend = CentroidShortlistSearch(top_k=args.top_k, audit_rate=0)
+    else:
+        backend = IVFSearch(nlist=args.nlist, nprobe=args.nprobe, min_templates=0, index_path='')
+    approximate_gallery = GalleryIndex(backend=backend)
+    approximate_gallery.load(employees)
+
+    queries = make_queries(exact_gallery, args.queries, args.noise)
+    report = recall_report(exact_gallery, approximate_gallery, queries, threshold=args.threshold)
+
+    print("\n" + "=" * 60)
+    print("📊 APPROXIMATE vs EXACT SEARCH REPORT")
+    print("=" * 60)
+    print(json.dumps(report, indent=2))
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"💾 Report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()